@@ -9,39 +9,37 @@
 # 79: -------------------------------------------------------------------------
 
 # imports: --------------------------------------------------------------------
+import sys
 import pandas as pd
-import subprocess
+from pyspark.sql import SparkSession
+from spark_cache import cached_table, local_uri
+
+# spark session, the existing one when run in the pyspark shell: --------------
+spark = SparkSession.builder.getOrCreate()
+sqlContext = spark
 
 # read data and register in SQL: ----------------------------------------------
-path = '/user/jbhender/stats507/demo/'
+# pass a local directory to run in local mode, e.g. with spark-submit
+if len(sys.argv) > 1:
+    path = local_uri(sys.argv[1])
+else:
+    path = '/user/jbhender/stats507/demo/'
 stems = ['recs09', 'w09']
 tables = ['recs09', 'w09']
 
-# dictionary of spark data frames
+# explicit schemas, stored next to the data on first use
+schemas = {
+    'recs09': 'id INT, region INT, weight DOUBLE, hdd65 DOUBLE, cdd65 DOUBLE',
+    'w09': 'id INT, repl STRING, rw DOUBLE'
+}
+
+# dictionary of spark data frames, read from (or cached to) parquet
 dfd = dict()
 for stem, table in zip(stems, tables):
-    # transfer to parquet
-    pq_file = path + stem + '.parquet'
-    
-    # check if parquet file exists
-    proc = subprocess.Popen(['hadoop', 'fs', '-test', '-e', pq_file])
-    _ = proc.communicate()
-
-    if proc.returncode == 0:
-        # read existing parquet file
-        dfd[stem] = sqlContext.read.parquet(pq_file)
-    else:
-        # read from feather and create parquet
-        file_name = path + stem + '.csv'
-        dfd[stem] = sqlContext.read.csv(
-            file_name,
-            header=True,
-            inferSchema=True
-        )
-        dfd[stem].write.parquet(pq_file)
+    dfd[stem] = cached_table(spark, path, stem, schema=schemas[stem])
 
     # create a table handle
-    dfd[stem].registerTempTable(table)
+    dfd[stem].createOrReplaceTempView(table)
 
 # compute point estimates: ----------------------------------------------------
 
@@ -112,6 +110,10 @@ ci = ci.persist()
 ci_df = ci.collect()
 
 # write result to disk: -------------------------------------------------------
-ci.coalesce(1).write.csv(path + 'avg_hdd_cdd_2009.csv', header=True)
+ci.coalesce(1).write.csv(
+    path.rstrip('/') + '/avg_hdd_cdd_2009.csv',
+    header=True,
+    mode='overwrite'
+)
 
 # 79: -------------------------------------------------------------------------
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Compare shuffle volume and stage time of the Spark replicate-estimate
+# strategies in recs_sql.py: the original long-table join, a broadcast of
+# recs09, and a single aggregation over wide weights.
+#
+# Spark runs in local mode and reads the csv files itself. For each
+# strategy, the input tables are first registered and cached, including the
+# pivot for "wide", and timed as `prep_s`. The query chain then runs under
+# its own job group, timed as `query_s`, and the jobs and stages in that
+# group are read back from the Spark UI's REST API
+# (/api/v1/applications/<app id>/jobs and .../stages). Usage:
+#
+#   python recs_spark_bench.py <data path> [strategy ...]
+# 79: -------------------------------------------------------------------------
+
+# imports: --------------------------------------------------------------------
+import sys
+import json
+import time
+import urllib.request
+import pandas as pd
+from pyspark.sql import SparkSession
+import recs_sql
+
+# Spark UI REST API: ----------------------------------------------------------
+def _get(sc, endpoint):
+    """
+    Read an endpoint of the REST API for the current application.
+    """
+    url = '{0}/api/v1/applications/{1}/{2}'.format(
+        sc.uiWebUrl, sc.applicationId, endpoint
+    )
+    with urllib.request.urlopen(url) as f:
+        return(json.loads(f.read().decode('utf-8')))
+
+def group_metrics(sc, group):
+    """
+    Sum shuffle bytes and executor run time over the stages of a job group.
+
+    Parameters
+    ----------
+    sc : SparkContext
+    The context the jobs ran in, with the UI enabled.
+    group : str
+    The job group, as passed to `sc.setJobGroup()`.
+
+    Returns
+    -------
+    A dict with the number of stages, shuffle read and write in MB, and
+    executor run time in seconds.
+    """
+    stage_ids = set()
+    for job in _get(sc, 'jobs'):
+        if job.get('jobGroup') == group:
+            stage_ids.update(job['stageIds'])
+    out = {'stages': 0, 'shuffle_read_mb': 0, 'shuffle_write_mb': 0,
+           'stage_s': 0}
+    for stage in _get(sc, 'stages'):
+        if stage['stageId'] not in stage_ids:
+            continue
+        out['stages'] += 1
+        out['shuffle_read_mb'] += stage['shuffleReadBytes'] / 2 ** 20
+        out['shuffle_write_mb'] += stage['shuffleWriteBytes'] / 2 ** 20
+        out['stage_s'] += stage['executorRunTime'] / 1000
+    return(out)
+
+# run the strategies: ---------------------------------------------------------
+if __name__ == '__main__':
+    path = sys.argv[1]
+    strategies = sys.argv[2:] or list(recs_sql._strategies)
+
+    spark = (
+        SparkSession.builder
+        .master('local[*]')
+        .appName('recs_spark_bench')
+        .config('spark.ui.enabled', 'true')
+        .getOrCreate()
+    )
+    sc = spark.sparkContext
+    tables = recs_sql.spark_tables(spark, path)
+
+    res = []
+    for strategy in strategies:
+        # register and cache the inputs, including the pivot for "wide"
+        t0 = time.perf_counter()
+        sc.setJobGroup('prep_' + strategy, 'register tables: ' + strategy)
+        repl = recs_sql.spark_register(spark, tables, strategy=strategy)
+        for view in ['recs09', 'w09w' if strategy == 'wide' else 'w09']:
+            spark.table(view).cache().count()
+        prep = time.perf_counter() - t0
+
+        # time the query chain alone
+        sc.setJobGroup(strategy, 'replicate estimates: ' + strategy)
+        t0 = time.perf_counter()
+        recs_sql.spark_ci(spark, strategy=strategy, repl=repl)
+        wall = time.perf_counter() - t0
+        metrics = group_metrics(sc, strategy)
+        metrics.update({'strategy': strategy, 'prep_s': prep, 'query_s': wall})
+        res.append(metrics)
+        spark.catalog.clearCache()
+
+    res = pd.DataFrame(res).set_index('strategy')
+    print(res.round(3).to_string())
+    spark.stop()
+
+# 79: -------------------------------------------------------------------------
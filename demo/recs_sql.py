@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Interchangeable SQL backends for the RECS replicate-weight pipeline.
+#
+# The point estimate (pe), replicate estimate (re), standard error (se), and
+# confidence interval (ci) queries from `pyspark_recs_demo.py` are run
+# against Spark in local mode, an in-process sqlite3 database, or pandas,
+# chosen by the `backend` argument of `recs_ci()`.
+# 79: -------------------------------------------------------------------------
+
+# imports: --------------------------------------------------------------------
+import os
+import math
+import sqlite3
+import pandas as pd
+
+# queries, as in pyspark_recs_demo.py: ----------------------------------------
+QUERIES = dict()
+
+QUERIES['pe'] = """
+SELECT
+  region,
+  sum(hdd65 * weight) / sum(weight) AS hdd65_avg,
+  sum(cdd65 * weight) / sum(weight) AS cdd65_avg
+FROM recs09
+GROUP BY region
+"""
+
+QUERIES['re'] = """
+SELECT
+  a.region,
+  b.repl,
+  sum(a.hdd65 * b.rw) / sum(b.rw) as hdd65r,
+  sum(a.cdd65 * b.rw) / sum(b.rw) as cdd65r
+FROM recs09 a
+LEFT JOIN w09 b
+  ON b.id = a.id
+GROUP BY region, repl
+"""
+
+# broadcast the small recs09 table, so the long w09 table is not shuffled
+QUERIES['re_broadcast'] = """
+SELECT /*+ BROADCAST(a) */
+  a.region,
+  b.repl,
+  sum(a.hdd65 * b.rw) / sum(b.rw) as hdd65r,
+  sum(a.cdd65 * b.rw) / sum(b.rw) as cdd65r
+FROM w09 b
+INNER JOIN recs09 a
+  ON b.id = a.id
+GROUP BY region, repl
+"""
+
+QUERIES['se'] = """
+SELECT
+  pe.region,
+  2 * sqrt(avg((hdd65_avg - hdd65r) * (hdd65_avg - hdd65r))) as hdd_se,
+  2 * sqrt(avg((cdd65_avg - cdd65r) * (cdd65_avg - cdd65r))) as cdd_se
+FROM re
+INNER JOIN pe
+  ON re.region = pe.region
+GROUP BY pe.region
+"""
+
+QUERIES['ci'] = """
+SELECT
+  pe.region,
+  hdd65_avg,
+  hdd65_avg - 1.96 * hdd_se AS hdd65_lwr,
+  hdd65_avg + 1.96 * hdd_se AS hdd65_upr,
+  cdd65_avg,
+  cdd65_avg - 1.96 * cdd_se AS cdd65_lwr,
+  cdd65_avg + 1.96 * cdd_se AS cdd65_upr
+FROM pe
+INNER JOIN se
+  ON pe.region = se.region
+"""
+
+# data: -----------------------------------------------------------------------
+def load_tables(path):
+    """
+    Read the recs09 and w09 tables used by the demo.
+
+    Parameters
+    ----------
+    path : str
+    Directory with recs09.csv (id, region, weight, hdd65, cdd65) and w09.csv
+    (id, repl, rw), the replicate weights in long format.
+
+    Returns
+    -------
+    A dict of DataFrames keyed by table name.
+    """
+    recs09 = pd.read_csv(
+        os.path.join(path, 'recs09.csv'),
+        usecols=['id', 'region', 'weight', 'hdd65', 'cdd65']
+    )
+    w09 = pd.read_csv(
+        os.path.join(path, 'w09.csv'),
+        usecols=['id', 'repl', 'rw']
+    )
+    return({'recs09': recs09, 'w09': w09})
+
+# Spark tables: ---------------------------------------------------------------
+# columns and types, as in the schemas of pyspark_recs_demo.py
+SPARK_COLUMNS = {
+    'recs09': [('id', 'int'), ('region', 'int'), ('weight', 'double'),
+               ('hdd65', 'double'), ('cdd65', 'double')],
+    'w09': [('id', 'int'), ('repl', 'string'), ('rw', 'double')]
+}
+
+def spark_tables(spark, path):
+    """
+    Read the recs09 and w09 tables with Spark's csv reader.
+
+    The files are read by the JVM rather than serialized from pandas, with
+    columns selected by name and cast, so there is no schema inference pass.
+
+    Parameters
+    ----------
+    spark : SparkSession
+    The active session.
+    path : str
+    Directory (or URI) with recs09.csv and w09.csv, see `load_tables()`.
+
+    Returns
+    -------
+    A dict of Spark DataFrames keyed by table name.
+    """
+    tables = {}
+    path = path.rstrip('/') + '/'
+    for name, cols in SPARK_COLUMNS.items():
+        df = spark.read.csv(path + name + '.csv', header=True)
+        tables[name] = df.select([df[c].cast(t) for c, t in cols])
+    return(tables)
+
+# wide replicate weights: -----------------------------------------------------
+def wide_weights(w09):
+    """
+    Pivot the long replicate weights to one row per id with Spark.
+
+    The pivot is coalesced to the default parallelism, since each task of
+    the wide aggregation in `re_wide_query()` carries state for every
+    replicate and the shuffle would otherwise leave one per shuffle
+    partition.
+
+    Parameters
+    ----------
+    w09 : Spark DataFrame
+    Replicate weights in long format with columns id, repl, and rw.
+
+    Returns
+    -------
+    A tuple with a Spark DataFrame with columns id, rw0, ..., rw{R-1} and a
+    sorted list of the R replicate labels in the same order.
+    """
+    from pyspark.sql import functions as F
+    repl = sorted(r[0] for r in w09.select('repl').distinct().collect())
+    wide = w09.groupBy('id').pivot('repl', repl).agg(F.first('rw'))
+    wide = wide.toDF('id', *['rw' + str(i) for i in range(len(repl))])
+    wide = wide.coalesce(w09.sparkSession.sparkContext.defaultParallelism)
+    return((wide, repl))
+
+def re_wide_query(repl):
+    """
+    Build a replicate estimate query for wide weights.
+
+    A single join of recs09 to the wide weights, one row per id, and a
+    single aggregation by region compute the replicate sums for all
+    replicates at once. `stack()` then returns them in the long (region,
+    repl) shape of the `re` query, so the `se` and `ci` queries are
+    unchanged.
+
+    Parameters
+    ----------
+    repl : list
+    Replicate labels, as returned by `wide_weights()`.
+
+    Returns
+    -------
+    A Spark SQL query reading the tables recs09 and w09w.
+    """
+    sums, cols = [], []
+    for i, r in enumerate(repl):
+        w = 'b.rw{0:d}'.format(i)
+        for v in ['hdd65', 'cdd65']:
+            sums.append(
+                '  sum(a.{0} * {1}) / sum({1}) AS {0}_{2:d}'.format(v, w, i)
+            )
+        label = "'{0}'".format(r) if isinstance(r, str) else str(r)
+        cols.append('{0}, hdd65_{1:d}, cdd65_{1:d}'.format(label, i))
+    inner = (
+        'SELECT /*+ BROADCAST(a) */\n  a.region,\n' + ',\n'.join(sums) +
+        '\nFROM w09w b\nINNER JOIN recs09 a\n  ON b.id = a.id\n' +
+        'GROUP BY a.region'
+    )
+    query = (
+        'SELECT\n  region,\n  stack({0:d}, '.format(len(repl)) +
+        ', '.join(cols) + ') AS (repl, hdd65r, cdd65r)\n' +
+        'FROM (\n' + inner + '\n) w'
+    )
+    return(query)
+
+# backends: -------------------------------------------------------------------
+def spark_register(spark, tables, strategy='join'):
+    """
+    Register the tables as Spark temporary views for a `strategy`.
+
+    `tables` are Spark DataFrames from `spark_tables()`, or pandas
+    DataFrames from `load_tables()` which are converted with
+    `createDataFrame()`; enable `spark.sql.execution.arrow.pyspark.enabled`
+    to convert them with Arrow rather than row by row. For the "wide"
+    strategy the long weights are first pivoted, see `wide_weights()`, and
+    registered as w09w. Kept apart from `spark_ci()` so benchmarks can time
+    the queries alone.
+
+    Returns
+    -------
+    The replicate labels for the "wide" strategy, otherwise None.
+    """
+    tables = {
+        name: spark.createDataFrame(df) if isinstance(df, pd.DataFrame) else df
+        for name, df in tables.items()
+    }
+    tables['recs09'].createOrReplaceTempView('recs09')
+    if strategy == 'wide':
+        w09w, repl = wide_weights(tables['w09'])
+        w09w.createOrReplaceTempView('w09w')
+        return(repl)
+    tables['w09'].createOrReplaceTempView('w09')
+    return(None)
+
+def spark_ci(spark, strategy='join', repl=None):
+    """
+    Run the query chain on views registered by `spark_register()`.
+
+    The `strategy` for the replicate estimates is "join" for the original
+    long-table join, "broadcast" to broadcast recs09 to the long weights,
+    or "wide" to aggregate wide weights, see `re_wide_query()`.
+    """
+    if strategy == 'wide':
+        re_query = re_wide_query(repl)
+    else:
+        re_query = QUERIES['re' if strategy == 'join' else 're_broadcast']
+    spark.sql(QUERIES['pe']).createOrReplaceTempView('pe')
+    spark.sql(re_query).createOrReplaceTempView('re')
+    spark.sql(QUERIES['se']).createOrReplaceTempView('se')
+    return(spark.sql(QUERIES['ci']).toPandas())
+
+def _run_spark(tables, strategy='join'):
+    """
+    Run the query chain with Spark in local mode.
+
+    A directory `tables` is read by Spark itself, see `spark_tables()`.
+    """
+    from pyspark.sql import SparkSession
+    spark = (
+        SparkSession.builder
+        .master('local[*]')
+        .appName('recs_sql')
+        .config('spark.sql.execution.arrow.pyspark.enabled', 'true')
+        .getOrCreate()
+    )
+    if isinstance(tables, str):
+        tables = spark_tables(spark, tables)
+    repl = spark_register(spark, tables, strategy=strategy)
+    return(spark_ci(spark, strategy=strategy, repl=repl))
+
+def _run_sqlite(tables):
+    """
+    Run the query chain in an in-memory sqlite3 database.
+
+    sqlite has no sqrt(), so Python's is registered with create_function().
+    sqlite's `/` also truncates when both operands are integers, so the
+    weights and degree days are stored as REAL.
+    """
+    real = ['weight', 'hdd65', 'cdd65', 'rw']
+    con = sqlite3.connect(':memory:')
+    con.create_function('sqrt', 1, math.sqrt, deterministic=True)
+    try:
+        for name, df in tables.items():
+            cols = {c: 'float64' for c in real if c in df.columns}
+            df.astype(cols).to_sql(name, con, index=False)
+        con.execute('CREATE INDEX w09_id ON w09 (id)')
+        for name in ['pe', 're', 'se']:
+            con.execute('CREATE TEMP TABLE ' + name + ' AS ' + QUERIES[name])
+        ci = pd.read_sql_query(QUERIES['ci'], con)
+    finally:
+        con.close()
+    return(ci)
+
+def _run_pandas(tables):
+    """
+    Run the same chain as DataFrame operations.
+    """
+    recs09, w09 = tables['recs09'], tables['w09']
+    dd = ['hdd65', 'cdd65']
+
+    # pe
+    wx = recs09[dd].multiply(recs09['weight'], axis=0)
+    wx['weight'] = recs09['weight']
+    wx['region'] = recs09['region']
+    pe = wx.groupby('region').sum()
+    pe = pe[dd].divide(pe['weight'], axis=0)
+
+    # re
+    a = pd.merge(recs09[['id', 'region'] + dd], w09, on='id', how='left')
+    for v in dd:
+        a[v] = a[v] * a['rw']
+    re = a.groupby(['region', 'repl'])[dd + ['rw']].sum()
+    re = re[dd].divide(re['rw'], axis=0)
+
+    # se
+    dev = re.subtract(pe, level='region') ** 2
+    se = 2 * dev.groupby('region').mean() ** 0.5
+
+    # ci
+    ci = pd.DataFrame(index=pe.index)
+    for v in dd:
+        ci[v + '_avg'] = pe[v]
+        ci[v + '_lwr'] = pe[v] - 1.96 * se[v]
+        ci[v + '_upr'] = pe[v] + 1.96 * se[v]
+    return(ci.reset_index())
+
+_backends = {'spark': _run_spark, 'sqlite': _run_sqlite, 'pandas': _run_pandas}
+
+_strategies = ('join', 'broadcast', 'wide')
+
+def recs_ci(tables, backend='sqlite', strategy='join'):
+    """
+    Estimate average heating and cooling degree days by region with CIs.
+
+    Parameters
+    ----------
+    tables : dict or str
+    DataFrames `recs09` and `w09`, see `load_tables()`, or the directory to
+    read them from. Spark reads a directory with its own csv reader.
+    backend : str
+    One of "spark" (local mode), "sqlite", or "pandas".
+    strategy : str
+    How Spark computes the replicate estimates: "join", "broadcast", or
+    "wide", see `spark_ci()`. Ignored by the other backends.
+
+    Returns
+    -------
+    A DataFrame with one row per region, sorted by region, and columns as
+    in the `ci` query.
+    """
+    if backend not in _backends:
+        msg = "backend must be one of: " + ', '.join(_backends) + '.'
+        raise ValueError(msg)
+    if strategy not in _strategies:
+        msg = "strategy must be one of: " + ', '.join(_strategies) + '.'
+        raise ValueError(msg)
+    if backend == 'spark':
+        ci = _run_spark(tables, strategy=strategy)
+    else:
+        if isinstance(tables, str):
+            tables = load_tables(tables)
+        ci = _backends[backend](tables)
+    return(ci.sort_values('region').reset_index(drop=True))
+
+# 79: -------------------------------------------------------------------------
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Benchmark the RECS query chain across the backends in recs_sql.py.
+#
+# Each backend runs in a freshly spawned process so that its wall time and
+# peak resident memory (resource.getrusage, ru_maxrss) are not affected by
+# the others. Spark reads the csv files itself, within the query, so its
+# load time is near zero. ru_maxrss covers only the Python process; for
+# Spark, the peak RSS of its JVM is read from the Spark UI's REST API
+# (/api/v1/applications/<app id>/executors) and reported as `jvm_peak_mb`,
+# which is N/A for the other backends. Usage:
+#
+#   python recs_sql_bench.py <data path> [backend ...]
+# 79: -------------------------------------------------------------------------
+
+# imports: --------------------------------------------------------------------
+import sys
+import json
+import time
+import urllib.request
+import resource
+import pandas as pd
+import multiprocessing as mp
+import recs_sql
+
+# Spark session and JVM memory: -----------------------------------------------
+def _spark_session():
+    """
+    Start the local Spark session `recs_sql` reuses, sampling the JVM's
+    process-tree memory so its peak RSS is recorded.
+    """
+    from pyspark.sql import SparkSession
+    return(
+        SparkSession.builder
+        .master('local[*]')
+        .appName('recs_sql_bench')
+        .config('spark.ui.enabled', 'true')
+        .config('spark.sql.execution.arrow.pyspark.enabled', 'true')
+        .config('spark.executor.processTreeMetrics.enabled', 'true')
+        .config('spark.executor.metrics.pollingInterval', '100ms')
+        .getOrCreate()
+    )
+
+def jvm_peak_mb(sc):
+    """
+    Return the peak RSS of the JVM of a local-mode SparkContext in MB.
+
+    In local mode the driver is the only executor, so this is the largest
+    `ProcessTreeJVMRSSMemory` in its `peakMemoryMetrics`.
+    """
+    url = '{0}/api/v1/applications/{1}/executors'.format(
+        sc.uiWebUrl, sc.applicationId
+    )
+    with urllib.request.urlopen(url) as f:
+        executors = json.loads(f.read().decode('utf-8'))
+    peak = [
+        e.get('peakMemoryMetrics', {}).get('ProcessTreeJVMRSSMemory', 0)
+        for e in executors
+    ]
+    return(max(peak) / 2 ** 20)
+
+# run one backend: ------------------------------------------------------------
+def bench(path, backend):
+    """
+    Load the tables and run the query chain with a single backend.
+
+    Parameters
+    ----------
+    path : str
+    Directory with the tables, see `recs_sql.load_tables()`.
+    backend : str
+    The backend to use.
+
+    Returns
+    -------
+    A dict with the backend, load and query wall times in seconds, and peak
+    memory of this process and, for Spark, its JVM in MB.
+    """
+    if backend == 'spark':
+        spark = _spark_session()
+
+    t0 = time.perf_counter()
+    tables = path if backend == 'spark' else recs_sql.load_tables(path)
+    t1 = time.perf_counter()
+    recs_sql.recs_ci(tables, backend=backend)
+    t2 = time.perf_counter()
+
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+    jvm = float('nan')
+    if backend == 'spark':
+        jvm = jvm_peak_mb(spark.sparkContext)
+        spark.stop()
+    return({
+        'backend': backend,
+        'load_s': t1 - t0,
+        'query_s': t2 - t1,
+        'peak_mb': rss,
+        'jvm_peak_mb': jvm
+    })
+
+# run all backends: -----------------------------------------------------------
+if __name__ == '__main__':
+    path = sys.argv[1]
+    backends = sys.argv[2:] or ['pandas', 'sqlite', 'spark']
+
+    ctx = mp.get_context('spawn')
+    res = []
+    for backend in backends:
+        with ctx.Pool(1) as pool:
+            res.append(pool.apply(bench, (path, backend)))
+    res = pd.DataFrame(res).set_index('backend')
+    print(res.round(3).to_string(na_rep='N/A'))
+
+# 79: -------------------------------------------------------------------------
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Parquet caches for Spark tables, checked in-process.
+#
+# Whether a cache exists is checked with the Hadoop FileSystem API through
+# the JVM Spark already runs, rather than a `hadoop fs -test` subprocess,
+# and csv files are read with an explicit schema stored as JSON next to the
+# data, rather than `inferSchema=True`. Paths may use any scheme Hadoop
+# knows, including hdfs:// and file:// for local runs.
+# 79: -------------------------------------------------------------------------
+
+# imports: --------------------------------------------------------------------
+import os
+import json
+from pyspark.sql.types import StructType
+
+# Hadoop FileSystem API: ------------------------------------------------------
+def _fs_path(spark, path):
+    """
+    Return the Hadoop FileSystem and Path objects for `path`.
+
+    The file system is chosen by the scheme of `path`, e.g. hdfs:// or
+    file://, or the default file system if there is none.
+    """
+    jpath = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jpath.getFileSystem(spark._jsc.hadoopConfiguration())
+    return((fs, jpath))
+
+def exists(spark, path):
+    """
+    Check whether `path` exists, without launching a subprocess.
+    """
+    fs, jpath = _fs_path(spark, path)
+    return(fs.exists(jpath))
+
+def write_text(spark, path, text):
+    """
+    Write (overwrite) a small UTF-8 text file at `path`.
+    """
+    fs, jpath = _fs_path(spark, path)
+    out = fs.create(jpath, True)
+    try:
+        out.write(bytearray(text.encode('utf-8')))
+    finally:
+        out.close()
+
+def read_text(spark, path):
+    """
+    Read a small UTF-8 text file at `path`.
+    """
+    fs, jpath = _fs_path(spark, path)
+    jio = spark._jvm.java.io
+    reader = jio.BufferedReader(jio.InputStreamReader(fs.open(jpath), 'UTF-8'))
+    lines = []
+    try:
+        line = reader.readLine()
+        while line is not None:
+            lines.append(line)
+            line = reader.readLine()
+    finally:
+        reader.close()
+    return('\n'.join(lines))
+
+# local paths: ----------------------------------------------------------------
+def local_uri(path):
+    """
+    Convert a local path to a file:// URI for local-mode runs.
+    """
+    return('file://' + os.path.abspath(os.path.expanduser(path)))
+
+# schemas: --------------------------------------------------------------------
+def read_schema(spark, path):
+    """
+    Read a schema stored with `write_schema()`, or None if there is none.
+    """
+    if not exists(spark, path):
+        return(None)
+    return(StructType.fromJson(json.loads(read_text(spark, path))))
+
+def write_schema(spark, path, schema):
+    """
+    Store `schema`, a StructType, as JSON at `path`.
+    """
+    write_text(spark, path, schema.json())
+
+# cached tables: --------------------------------------------------------------
+def cached_table(spark, path, stem, schema=None):
+    """
+    Read a table from its parquet cache, creating the cache if needed.
+
+    Parameters
+    ----------
+    spark : SparkSession
+    The active session.
+    path : str
+    Directory (URI) with <stem>.csv. The cache <stem>.parquet and schema
+    <stem>.schema.json are kept alongside it.
+    stem : str
+    Name of the table.
+    schema : StructType, str, or None
+    Schema for reading the csv. A schema passed here is preferred; if it
+    differs from the stored schema, the cache is rebuilt with it. If None,
+    the stored schema is used, or, if neither exists, the schema is
+    inferred once and stored so later runs never infer it again.
+
+    Returns
+    -------
+    A Spark DataFrame.
+    """
+    path = path.rstrip('/') + '/'
+    pq_file = path + stem + '.parquet'
+    schema_file = path + stem + '.schema.json'
+    stored = read_schema(spark, schema_file)
+    if schema is not None:
+        # parse a DDL string to compare with the stored StructType
+        schema = spark.createDataFrame([], schema).schema
+    if exists(spark, pq_file) and (schema is None or schema == stored):
+        return(spark.read.parquet(pq_file))
+
+    schema = schema or stored
+    csv_file = path + stem + '.csv'
+    if schema is None:
+        df = spark.read.csv(csv_file, header=True, inferSchema=True)
+    else:
+        df = spark.read.csv(csv_file, header=True, schema=schema)
+    df.write.parquet(pq_file, mode='overwrite')
+    write_schema(spark, schema_file, df.schema)
+    return(spark.read.parquet(pq_file))
+
+# 79: -------------------------------------------------------------------------
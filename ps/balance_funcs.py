@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Balance tables comparing variables across the levels of a grouping column.
+Stats 507, Fall 2021
+
+This generalizes `assess_balance()` and `compare_means()` from Problem Set 4,
+Question 1. Rather than a `groupby` and row-wise `.apply` per variable, all
+variables are tabulated from integer (categorical) codes with `np.bincount`,
+the tests are computed vectorized across variables, and the strings are
+formatted once at the end.
+"""
+# 79: -------------------------------------------------------------------------
+
+# imports
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2, f as f_dist, t as t_dist
+
+# integer codes for a column
+def _codes(x):
+    """
+    Return integer codes and level labels for a Series.
+
+    Categorical columns keep the order of their categories, others use the
+    sorted unique values. Missing values are coded as -1.
+    """
+    if isinstance(x.dtype, pd.CategoricalDtype):
+        return((np.asarray(x.cat.codes), list(x.cat.categories)))
+    codes, levels = pd.factorize(x, sort=True)
+    return((codes, list(levels)))
+
+# p-value formatting
+def _p_str(p):
+    """
+    Format p-values as in problem set 4.
+    """
+    return(['p < 0.001' if v < 0.001 else 'p = {0:5.3f}'.format(v)
+            for v in np.asarray(p).tolist()])
+
+# contingency tables for several categorical variables
+def _contingency(df, rows, col_codes, k):
+    """
+    Tabulate each variable in `rows` against the column codes.
+
+    All tables come from a single `np.bincount` over offset codes.
+
+    Returns
+    -------
+    A list of tuples (levels, table) with the observed row levels and an
+    integer array of counts with shape (len(levels), k).
+
+    """
+    keep = col_codes >= 0
+    codes, offsets, levels = [], [0], []
+    for v in rows:
+        r, lv = _codes(df[v])
+        ok = np.logical_and(keep, r >= 0)
+        codes.append(offsets[-1] + r[ok] * k + col_codes[ok])
+        offsets.append(offsets[-1] + len(lv) * k)
+        levels.append(lv)
+    counts = np.bincount(np.concatenate(codes), minlength=offsets[-1])
+
+    tables = []
+    for i, lv in enumerate(levels):
+        tab = counts[offsets[i]:offsets[i + 1]].reshape((len(lv), k))
+        seen = tab.sum(axis=1) > 0
+        tables.append(([l for l, s in zip(lv, seen) if s], tab[seen]))
+    return(tables)
+
+# chi-squared tests for several tables
+def _chi2_tests(tables):
+    """
+    Compute chi-squared tests of independence for a list of tables.
+
+    Tables are zero-padded to a common shape so the statistics are computed
+    in one vectorized pass. As in `scipy.stats.chi2_contingency()`, Yates'
+    correction is applied to tables with one degree of freedom.
+
+    Returns
+    -------
+    An array of p-values, one per table.
+
+    """
+    r = max(t.shape[0] for t in tables)
+    obs = np.zeros((len(tables), r, tables[0].shape[1]))
+    for i, t in enumerate(tables):
+        obs[i, :t.shape[0], :] = t
+    row, col = obs.sum(axis=2), obs.sum(axis=1)
+    tot = row.sum(axis=1)
+    exp = row[:, :, None] * col[:, None, :] / tot[:, None, None]
+    dof = ((row > 0).sum(axis=1) - 1) * ((col > 0).sum(axis=1) - 1)
+
+    # Yates' correction for 2 x 2 tables
+    diff = exp - obs
+    yates = (dof == 1)[:, None, None]
+    adj = np.sign(diff) * np.minimum(0.5, np.abs(diff))
+    obs = np.where(yates, obs + adj, obs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stat = np.where(exp > 0, (obs - exp) ** 2 / exp, 0).sum(axis=(1, 2))
+    return(chi2.sf(stat, dof))
+
+# group means and variances for several numeric variables
+def _group_moments(df, rows, col_codes, k):
+    """
+    Compute counts, means, and variances (ddof=1) by group.
+
+    Variances of groups with fewer than two observations are NaN.
+
+    Moments for all variables come from three `np.bincount` calls over
+    group codes offset by variable. Missing values are excluded.
+
+    Returns
+    -------
+    A tuple (n, mean, var) of arrays with shape (len(rows), k).
+
+    """
+    x = np.column_stack([np.asarray(df[v], dtype='float64') for v in rows])
+    ok = np.logical_and((col_codes >= 0)[:, None], ~np.isnan(x))
+    codes = (col_codes[:, None] + k * np.arange(len(rows))[None, :])[ok]
+    x = x[ok]
+    size = k * len(rows)
+    n = np.bincount(codes, minlength=size).reshape((len(rows), k))
+    s1 = np.bincount(codes, weights=x, minlength=size).reshape(n.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s1 / n
+        dev = x - mean.ravel()[codes]
+        ss = np.bincount(codes, weights=dev ** 2, minlength=size)
+        var = np.where(n >= 2, ss.reshape(n.shape) / (n - 1), np.nan)
+    return((n, mean, var))
+
+# two-sample t-tests for several variables
+def _t_tests(n, mean, var):
+    """
+    Pooled two-sample t-tests, as `scipy.stats.ttest_ind()`, by row.
+    """
+    if n.shape[1] != 2:
+        raise ValueError("t-tests require exactly two column levels.")
+    df = n.sum(axis=1) - 2
+    sp2 = ((n - 1) * var).sum(axis=1) / df
+    tstat = (mean[:, 0] - mean[:, 1]) / np.sqrt(sp2 * (1 / n).sum(axis=1))
+    return(2 * t_dist.sf(np.abs(tstat), df))
+
+# one-way ANOVA for several variables
+def _anova_tests(n, mean, var):
+    """
+    One-way ANOVA F-tests, as `scipy.stats.f_oneway()`, by row.
+    """
+    k = (n > 0).sum(axis=1)
+    tot = n.sum(axis=1)
+    grand = (n * np.nan_to_num(mean)).sum(axis=1) / tot
+    ssb = (n * np.nan_to_num(mean - grand[:, None]) ** 2).sum(axis=1)
+    ssw = np.nansum((n - 1) * var, axis=1)
+    fstat = (ssb / (k - 1)) / (ssw / (tot - k))
+    return(f_dist.sf(fstat, k - 1, tot - k))
+
+# Welch's heteroscedastic ANOVA for several variables
+def _welch_tests(n, mean, var):
+    """
+    Welch's (1951) one-way test, allowing unequal variances, by row.
+
+    With two levels this is the Welch two-sample t-test. Levels with fewer
+    than two observations are dropped.
+    """
+    ok = n >= 2
+    k = ok.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.where(ok, n / var, 0)
+        w_tot = w.sum(axis=1)
+        m_w = np.where(ok, w * mean, 0).sum(axis=1) / w_tot
+        dev = np.where(ok, w * (mean - m_w[:, None]) ** 2, 0)
+        a = dev.sum(axis=1) / (k - 1)
+        h = np.where(ok, (1 - w / w_tot[:, None]) ** 2 / (n - 1), 0)
+    tmp = h.sum(axis=1)
+    b = 1 + 2 * (k - 2) / (k ** 2 - 1) * tmp
+    return(f_dist.sf(a / b, k - 1, (k ** 2 - 1) / (3 * tmp)))
+
+# tests comparing means
+_mean_tests = {'t': _t_tests, 'anova': _anova_tests, 'welch': _welch_tests}
+
+# compare means of several variables across k levels
+def compare_means(rows, cols, df, test='t'):
+    """
+    Compare means of one or more numeric variables across levels of `cols`.
+
+    Group sizes, means, and standard deviations for every variable come
+    from a single pass of `np.bincount` over the codes of `cols`, so many
+    rows are tabulated at once and any number of levels is supported.
+
+    Parameters
+    ----------
+    rows : str or sequence of str.
+        Numeric column(s) in df whose means will be compared across levels
+        of cols. Missing values are excluded.
+    cols : str.
+        Categorical column in df whose levels will form columns in the
+        balance table.
+    df : DataFrame.
+        DataFrame where variables specified in rows and cols are found.
+    test : str, optional.
+        "t" for a pooled two-sample t-test (two levels only), "anova" for a
+        one-way ANOVA F-test, or "welch" for Welch's test allowing unequal
+        variances. The default is "t".
+
+    Returns
+    -------
+    Returns a pandas DataFrame giving mean and std of each variable in rows
+    for each level of cols and a p-value from the requested test.
+
+    """
+    rows = [rows] if isinstance(rows, str) else list(rows)
+    col_codes, col_levels = _codes(df[cols])
+    n, mean, var = _group_moments(df, rows, col_codes, len(col_levels))
+    p = _p_str(_mean_tests[test](n, mean, var))
+    sd = np.sqrt(var)
+    cells = [
+        ['{0:.1f} ({1:.1f})'.format(m, s) for m, s in zip(mr, sr)]
+        for mr, sr in zip(mean.tolist(), sd.tolist())
+    ]
+    tab = pd.DataFrame(cells, columns=col_levels, index=rows)
+    tab['p-value'] = p
+    return(tab)
+
+# build a balance table
+def balance_table(
+    df,
+    cols,
+    cat_vars=(),
+    num_vars=(),
+    order=None,
+    test='t'
+):
+    """
+    Construct a balance table comparing variables across levels of `cols`.
+
+    Parameters
+    ----------
+    df : DataFrame.
+        DataFrame where all variables are found.
+    cols : str.
+        Categorical column in df whose levels will form columns in the
+        balance table.
+    cat_vars : sequence of str, optional.
+        Categorical columns whose levels form rows giving counts and (row)
+        percents, with a p-value from a chi-squared test of independence.
+    num_vars : sequence of str, optional.
+        Numeric columns summarized by mean and std in each column level,
+        with a p-value from the test given by `test`.
+    order : sequence of str or None, optional.
+        The order in which variables appear in the table. The default
+        lists `cat_vars` and then `num_vars`.
+    test : str, optional.
+        The test for numeric variables, see `compare_means()`. The default
+        is "t", a two-sample t-test.
+
+    Returns
+    -------
+    A DataFrame with one column per level of `cols` plus a "p-value" column,
+    in the format produced by `assess_balance()` and `compare_means()` in
+    problem set 4.
+
+    """
+    col_codes, col_levels = _codes(df[cols])
+    k = len(col_levels)
+    cat_vars, num_vars = list(cat_vars), list(num_vars)
+    blocks = {}
+
+    # categorical variables
+    if cat_vars:
+        tables = _contingency(df, cat_vars, col_codes, k)
+        p = _p_str(_chi2_tests([t for _, t in tables]))
+        for v, (levels, tab), p_v in zip(cat_vars, tables, p):
+            pct = 100 * tab / tab.sum(axis=1, keepdims=True)
+            cells = [
+                ['{0:d} ({1:.1f}%)'.format(c, q) for c, q in zip(cr, qr)]
+                for cr, qr in zip(tab.tolist(), pct.tolist())
+            ]
+            blocks[v] = (levels, cells, p_v)
+
+    # numeric variables
+    if num_vars:
+        means = compare_means(num_vars, cols, df, test=test)
+        for v, row in zip(num_vars, means.values.tolist()):
+            blocks[v] = ([v], [row[:-1]], row[-1])
+
+    # assemble
+    index, rows, pvals = [], [], []
+    for v in (cat_vars + num_vars if order is None else order):
+        levels, cells, p_v = blocks[v]
+        index += levels
+        rows += cells
+        pvals += [p_v] + ['-'] * (len(levels) - 1)
+    tab = pd.DataFrame(rows, columns=col_levels, index=index)
+    tab['p-value'] = pvals
+    tab.index.name = 'variable'
+    return(tab)
+
+# 79: -------------------------------------------------------------------------
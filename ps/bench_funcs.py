@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Empirical scaling benchmarks for sets of functions.
+Stats 507, Fall 2021
+
+This generalizes the timing study from Problem Set 2, Question 2d. Rather
+than timing loops over two list lengths by hand, any set of functions is
+timed over a geometric sweep of input sizes, after warmup calls, and the
+scaling exponent b in time ~ n^b is estimated for each function by least
+squares on the log-log scale. Functions whose exponent exceeds one by more
+than a tolerance are flagged as super-linear. Tables can be returned as a
+DataFrame or formatted as markdown or HTML.
+"""
+# 79: -------------------------------------------------------------------------
+
+# imports
+import numpy as np
+import pandas as pd
+from timeit import Timer
+from scipy.stats import norm
+
+# function names
+def _named(funcs):
+    """
+    Return a dict of functions keyed by name from a dict or sequence.
+
+    Functions in a sequence are labeled by `__name__`, or the wrapped
+    function's name for a `functools.partial`; duplicate labels, e.g. from
+    two lambdas, raise an error rather than dropping a function.
+    """
+    if isinstance(funcs, dict):
+        return(dict(funcs))
+    named = {}
+    for f in funcs:
+        name = getattr(f, '__name__', None)
+        if name is None:
+            name = getattr(getattr(f, 'func', None), '__name__', repr(f))
+        if name in named:
+            msg = ("Duplicate function name '{0}'; pass a dict to label the "
+                   "functions.").format(name)
+            raise ValueError(msg)
+        named[name] = f
+    return(named)
+
+# geometric sweep of sizes
+def geom_sizes(n_min=100, n_max=100000, n_sizes=7):
+    """
+    Return up to `n_sizes` unique integer sizes evenly spaced on a log scale.
+    """
+    sizes = np.geomspace(n_min, n_max, n_sizes)
+    return(np.unique(np.round(sizes).astype('int64')).tolist())
+
+# run a timing study
+def scaling_bench(
+    funcs,
+    gen,
+    sizes=None,
+    reps=10,
+    warmup=1,
+    number=1
+):
+    """
+    Time each function over a sweep of input sizes.
+
+    For each size `n`, an input is generated once by `gen(n)` and shared by
+    all functions, so the cost of generating data is not timed. Each
+    function is called `warmup` times before `reps` timed repetitions.
+
+    Parameters
+    ----------
+    funcs : dict or sequence of callables.
+        The functions to time, each called with the generated input. A
+        sequence is labeled by the function names, which must be unique.
+    gen : callable.
+        Generates an input of size n, e.g. `tup_funcs.gen_list_of_tuples`.
+    sizes : sequence of ints or None, optional.
+        Input sizes. The default, None, uses `geom_sizes()`.
+    reps : int, optional.
+        Timed repetitions per function and size. The default is 10.
+    warmup : int, optional.
+        Untimed calls before timing. The default is 1.
+    number : int, optional.
+        Calls per repetition, the time reported is per call. The default
+        is 1.
+
+    Returns
+    -------
+    A long DataFrame with columns `func`, `n`, `rep`, and `time` (seconds).
+
+    """
+    funcs = _named(funcs)
+    sizes = geom_sizes() if sizes is None else list(sizes)
+    res = []
+    for n in sizes:
+        x = gen(n)
+        for name, f in funcs.items():
+            for _ in range(warmup):
+                f(x)
+            t = Timer(lambda: f(x)).repeat(repeat=reps, number=number)
+            res += [(name, n, r, s / number) for r, s in enumerate(t)]
+    return(pd.DataFrame(res, columns=['func', 'n', 'rep', 'time']))
+
+# scaling exponents
+def scaling_exponents(times, tol=0.15, level=0.95):
+    """
+    Estimate the exponent b in time ~ a * n^b for each function.
+
+    The exponent is the least squares slope of log(time) on log(n) using
+    all repetitions, with a standard error and confidence interval. A
+    function is flagged as super-linear when the lower confidence bound of
+    its exponent exceeds `1 + tol`.
+
+    Parameters
+    ----------
+    times : DataFrame.
+        As returned by `scaling_bench()`.
+    tol : float, optional.
+        Tolerance above an exponent of one. The default is 0.15.
+    level : float, optional.
+        Confidence level for the exponent. The default is 0.95.
+
+    Returns
+    -------
+    A DataFrame indexed by function with columns `exponent`, `se`, `lwr`,
+    `upr`, and `superlinear`.
+
+    """
+    z = norm.ppf(1 - (1 - level) / 2)
+    out = {}
+    for name, df in times.groupby('func', sort=False):
+        x, y = np.log(df['n'].to_numpy()), np.log(df['time'].to_numpy())
+        xc = x - x.mean()
+        b = np.sum(xc * (y - y.mean())) / np.sum(xc ** 2)
+        resid = y - y.mean() - b * xc
+        se = np.sqrt(np.sum(resid ** 2) / (len(x) - 2) / np.sum(xc ** 2))
+        out[name] = (b, se, b - z * se, b + z * se, b - z * se > 1 + tol)
+    cols = ['exponent', 'se', 'lwr', 'upr', 'superlinear']
+    tab = pd.DataFrame.from_dict(out, orient='index', columns=cols)
+    tab.index.name = 'func'
+    return(tab)
+
+# markdown tables
+def _markdown(df):
+    """
+    Format a DataFrame as a (GitHub) markdown table, index included.
+    """
+    df = df.reset_index()
+    cells = [[str(c) for c in df.columns]]
+    cells += [[str(v) for v in row] for row in df.values.tolist()]
+    widths = [max(len(r[j]) for r in cells) for j in range(len(cells[0]))]
+    lines = [
+        '| ' + ' | '.join(c.ljust(w) for c, w in zip(r, widths)) + ' |'
+        for r in cells
+    ]
+    lines.insert(1, '|' + '|'.join('-' * (w + 2) for w in widths) + '|')
+    return('\n'.join(lines))
+
+# format results
+def bench_table(
+    times,
+    output='frame',
+    str_fmt='{mean:.2e} ({lwr:.2e}, {upr:.2e})',
+    level=0.95,
+    tol=0.15
+):
+    """
+    Tabulate mean times with confidence intervals and scaling exponents.
+
+    Parameters
+    ----------
+    times : DataFrame.
+        As returned by `scaling_bench()`.
+    output : str, optional.
+        "frame" for a DataFrame, "markdown" or "html" for a string. The
+        default is "frame".
+    str_fmt : str, optional.
+        Format for each cell with keys `mean`, `lwr`, and `upr`.
+    level : float, optional.
+        Confidence level for the mean times and exponents. The default is
+        0.95.
+    tol : float, optional.
+        Tolerance for flagging super-linear functions, see
+        `scaling_exponents()`.
+
+    Returns
+    -------
+    A table with one row per input size and one column per function, with
+    cells giving the mean time per call (seconds) and a confidence interval,
+    followed by rows for the scaling exponent and the super-linear flag.
+
+    """
+    z = norm.ppf(1 - (1 - level) / 2)
+    summ = times.groupby(['n', 'func'], sort=False)['time'].agg(
+        ['mean', 'std', 'count']
+    )
+    half = z * summ['std'] / np.sqrt(summ['count'])
+    summ['lwr'], summ['upr'] = summ['mean'] - half, summ['mean'] + half
+    cells = pd.Series(
+        [str_fmt.format(**r) for r in summ.to_dict('records')],
+        index=summ.index
+    )
+    tab = cells.unstack('func')[list(times['func'].unique())]
+
+    exps = scaling_exponents(times, tol=tol, level=level)
+    tab.loc['exponent'] = [
+        '{0:.2f} ({1:.2f}, {2:.2f})'.format(*r)
+        for r in exps[['exponent', 'lwr', 'upr']].values.tolist()
+    ]
+    tab.loc['super-linear'] = ['yes' if s else 'no' for s in exps.superlinear]
+    tab.index.name = 'n'
+    tab.columns.name = None
+
+    if output == 'frame':
+        return(tab)
+    if output == 'markdown':
+        return(_markdown(tab))
+    if output == 'html':
+        return(tab.to_html(justify='left'))
+    raise ValueError("output must be 'frame', 'markdown', or 'html'.")
+
+# 79: -------------------------------------------------------------------------
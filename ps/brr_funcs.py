@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Survey estimates with balanced repeated replicate (BRR) weights.
+Stats 507, Fall 2021
+
+This generalizes the replicate-weight computations from Problem Set 3 for
+the Residential Energy Consumption Survey (RECS). Replicate weights are kept
+as a wide (n, R) float matrix rather than melted to a long table, and all
+replicate estimates for all domains and variables are formed by a single
+sparse-indicator times weight-matrix product.
+
+For replicate estimates theta_r, r = 1, ..., R, the variance of the full
+sample estimate theta is estimated using Fay's coefficient eps as
+
+    V(theta) = 1 / (R * (1 - eps)^2) * sum_r (theta_r - theta)^2.
+
+For quick exploratory work, means and ratios can instead use a Taylor
+linearization variance that needs only the full-sample weight (and design
+variables, if available), avoiding the R-fold replicate cost.
+"""
+# 79: -------------------------------------------------------------------------
+
+# imports
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import norm
+
+# align replicate weights with the data
+def _weight_matrix(df, rep_wts, weight='weight', on='id'):
+    """
+    Form the (n, R + 1) weight matrix with the full-sample weight first.
+
+    Parameters
+    ----------
+    df : DataFrame.
+        The data, with the full-sample weight in column `weight`.
+    rep_wts : DataFrame or array-like.
+        Replicate weights in wide format. A DataFrame is aligned with `df`
+        using the column `on` and its remaining columns are used as
+        replicate weights; an array must already be aligned with `df`.
+    weight, on : str, optional.
+        Names of the weight and identifier columns.
+
+    Returns
+    -------
+    A float array with columns: weight, replicate 1, ..., replicate R.
+
+    """
+    if isinstance(rep_wts, pd.DataFrame):
+        rep_wts = rep_wts.set_index(on).reindex(df[on])
+    rep_wts = np.asarray(rep_wts, dtype='float64')
+    if rep_wts.shape[0] != df.shape[0]:
+        raise ValueError("rep_wts should have one row per row of df.")
+    w = np.asarray(df[weight], dtype='float64')
+    return(np.column_stack([w, rep_wts]))
+
+# integer codes for domains
+def _domain_codes(df, domain):
+    """
+    Return integer domain codes and labels; a single domain if None.
+    """
+    if domain is None:
+        return((np.zeros(df.shape[0], dtype='int64'), ['all']))
+    x = df[domain]
+    if isinstance(x.dtype, pd.CategoricalDtype):
+        return((np.asarray(x.cat.codes), list(x.cat.categories)))
+    codes, levels = pd.factorize(x, sort=True)
+    return((codes, list(levels)))
+
+# stack numeric columns
+def _columns(df, variables):
+    """
+    Return the columns `variables` of `df` as an (n, V) float array.
+    """
+    return(np.column_stack(
+        [np.asarray(df[v], dtype='float64') for v in variables]
+    ))
+
+# domain totals for all variables and replicates
+def _domain_totals(x, wts, codes, k):
+    """
+    Compute weighted domain totals of `x` under every column of `wts`.
+
+    A sparse (V * k, n) matrix holding x[i, v] in row v * k + domain[i]
+    multiplies the (n, R + 1) weight matrix, giving every domain total for
+    every variable and replicate in one product. For the totals of the
+    weights over non-missing values, pass x as a 0/1 (or 1/NaN) indicator.
+
+    Parameters
+    ----------
+    x : ndarray of shape (n, V).
+        Variables to total; NaN values are excluded.
+    wts : ndarray of shape (n, R + 1).
+        Full-sample and replicate weights.
+    codes : ndarray of ints.
+        Domain codes in 0, ..., k - 1, or -1 to exclude a case.
+    k : int.
+        Number of domains.
+
+    Returns
+    -------
+    An array of totals with shape (V, k, R + 1).
+
+    """
+    n, n_var = x.shape
+    ok = np.logical_and((codes >= 0)[:, None], ~np.isnan(x))
+    rows = (codes[:, None] + k * np.arange(n_var)[None, :])[ok]
+    cols = np.broadcast_to(np.arange(n)[:, None], x.shape)[ok]
+    xs = sparse.csr_matrix((x[ok], (rows, cols)), shape=(n_var * k, n))
+    return(np.asarray(xs @ wts).reshape((n_var, k, -1)))
+
+# replicate standard errors
+def _replicate_se(theta, fay=0.5):
+    """
+    Compute standard errors from full-sample and replicate estimates.
+
+    Parameters
+    ----------
+    theta : ndarray.
+        Estimates with the full-sample estimate first along the last axis
+        followed by the R replicate estimates.
+    fay : float, optional.
+        Fay's coefficient. The default is 0.5.
+
+    Returns
+    -------
+    An array of standard errors with the last axis reduced.
+
+    """
+    reps = theta[..., 1:] - theta[..., :1]
+    r = reps.shape[-1]
+    return(np.sqrt(np.sum(reps ** 2, axis=-1) / (r * (1 - fay) ** 2)))
+
+# organize estimates in a tidy DataFrame
+def _estimate_frame(est, se, levels, variables, domain, level=0.95):
+    """
+    Tabulate (V, k) arrays of estimates and standard errors with CIs.
+    """
+    z = norm.ppf(1 - (1 - level) / 2)
+    idx = pd.MultiIndex.from_product(
+        [variables, levels], names=['variable', domain or 'domain']
+    )
+    est, se = np.ravel(est), np.ravel(se)
+    df = pd.DataFrame(
+        {'est': est, 'se': se, 'lwr': est - z * se, 'upr': est + z * se},
+        index=idx
+    )
+    return(df.swaplevel().sort_index(level=0, sort_remaining=False))
+
+# PSU codes for linearization
+def _psu_codes(strata, psu, n):
+    """
+    Return PSU codes for each case, stratum codes for each PSU, and the
+    number of PSUs in each stratum.
+    """
+    strata = np.zeros(n) if strata is None else np.asarray(strata)
+    psu = np.arange(n) if psu is None else np.asarray(psu)
+    _, h = np.unique(strata, return_inverse=True)
+    _, j = np.unique(psu, return_inverse=True)
+    _, p = np.unique(h * (j.max() + 1) + j, return_inverse=True)
+    h_psu = np.zeros(p.max() + 1, dtype='int64')
+    h_psu[p] = h
+    return((p, h_psu, np.bincount(h_psu)))
+
+# linearized standard errors for ratios
+def _linearized_se(y, x, w, codes, theta, den, strata=None, psu=None):
+    """
+    Compute Taylor linearization standard errors for domain ratios.
+
+    The linearization score for case i in domain d is
+    w_i * (y_i - theta_d * x_i) / X_d, where X_d is the weighted total of
+    x in domain d, and zero outside of domain d. The variance of each ratio
+    is the design variance of the total of its scores, as in
+    `ci_funcs.linearized_var()`.
+
+    Since each case belongs to one domain, PSU totals are formed by
+    grouped sums (`np.bincount`) over combined (PSU, domain) codes, one per
+    variable, and PSUs without cases in a domain enter the stratum sums of
+    squares as zero totals. Time and memory are O(n * V), plus
+    O(strata * k * V) for the sums.
+
+    Parameters
+    ----------
+    y, x : ndarray of shape (n, V).
+        Numerator and denominator variables, NaN where excluded.
+    w : ndarray of shape (n,).
+        Full-sample weights.
+    codes : ndarray of ints.
+        Domain codes in 0, ..., k - 1, or -1 to exclude a case.
+    theta, den : ndarray of shape (V, k).
+        Full-sample ratio estimates and denominator totals.
+    strata, psu : array-like or None, optional.
+        Design variables. If None, a single stratum in which every case is
+        its own PSU.
+
+    Returns
+    -------
+    An array of standard errors of shape (V, k).
+
+    """
+    n, n_var = y.shape
+    k = theta.shape[1]
+    ok = np.logical_and((codes >= 0)[:, None], ~np.isnan(y))
+    d = np.where(codes >= 0, codes, 0)
+    v = np.arange(n_var)[None, :]
+    with np.errstate(invalid='ignore'):
+        z = w[:, None] * (y - theta[v, d[:, None]] * x) / den[v, d[:, None]]
+    z = np.where(ok, z, 0)
+
+    # totals by (PSU, domain), and the stratum and domain of each
+    p, h_psu, n_h = _psu_codes(strata, psu, n)
+    groups, g = np.unique(p * k + d, return_inverse=True)
+    hd = h_psu[groups // k] * k + groups % k
+    m = len(n_h) * k
+    t = np.column_stack([
+        np.bincount(g, weights=z[:, i], minlength=len(groups))
+        for i in range(n_var)
+    ])
+
+    # deviations from stratum means, including PSUs with zero totals
+    n_hd = np.repeat(n_h, k).astype('float64')
+    t_bar = np.column_stack([
+        np.bincount(hd, weights=t[:, i], minlength=m) for i in range(n_var)
+    ]) / n_hd[:, None]
+    dev = (t - t_bar[hd]) ** 2
+    n_zero = n_hd - np.bincount(hd, minlength=m)
+    ss = np.column_stack([
+        np.bincount(hd, weights=dev[:, i], minlength=m) for i in range(n_var)
+    ]) + n_zero[:, None] * t_bar ** 2
+
+    # combine strata
+    f = np.where(n_h > 1, n_h / np.maximum(n_h - 1, 1), 0)
+    var = (np.repeat(f, k)[:, None] * ss).reshape((-1, k, n_var)).sum(axis=0)
+    return(np.sqrt(var).T)
+
+# ratio estimates and standard errors
+def _ratio_estimates(
+    df,
+    rep_wts,
+    y,
+    x,
+    domain=None,
+    weight='weight',
+    on='id',
+    fay=0.5,
+    variance='brr',
+    strata=None,
+    psu=None
+):
+    """
+    Estimate domain ratios sum(w * y) / sum(w * x) and standard errors.
+
+    See `domain_ratios()` for the parameters.
+
+    Returns
+    -------
+    A tuple (est, se, levels) with (V, k) arrays of estimates and standard
+    errors and the domain labels.
+
+    """
+    assert variance in ['brr', 'linearization']
+    codes, levels = _domain_codes(df, domain)
+    k = len(levels)
+    if variance == 'brr':
+        wts = _weight_matrix(df, rep_wts, weight=weight, on=on)
+    else:
+        wts = np.asarray(df[weight], dtype='float64')[:, None]
+    num = _domain_totals(y, wts, codes, k)
+    den = _domain_totals(x, wts, codes, k)
+    theta = num / den
+    if variance == 'brr':
+        return((theta[..., 0], _replicate_se(theta, fay=fay), levels))
+    strata = None if strata is None else np.asarray(df[strata])
+    psu = None if psu is None else np.asarray(df[psu])
+    se = _linearized_se(
+        y, x, wts[:, 0], codes, theta[..., 0], den[..., 0], strata, psu
+    )
+    return((theta[..., 0], se, levels))
+
+# domain means
+def domain_means(
+    df,
+    rep_wts,
+    variables,
+    domain=None,
+    weight='weight',
+    on='id',
+    fay=0.5,
+    level=0.95,
+    variance='brr',
+    strata=None,
+    psu=None
+):
+    """
+    Estimate weighted means with replicate-weight standard errors.
+
+    Parameters
+    ----------
+    df : DataFrame.
+        The data, including the full-sample weights and any domain column.
+    rep_wts : DataFrame, array-like, or None.
+        Replicate weights in wide format, see `_weight_matrix()`. Not used,
+        and may be None, when `variance="linearization"`.
+    variables : str or sequence of str.
+        Numeric columns of `df` to average.
+    domain : str or None, optional.
+        Column of `df` defining domains (e.g. Census region) in which to
+        estimate means. If None, the default, the whole sample is used.
+    weight : str, optional.
+        The full-sample weight column. The default is 'weight'.
+    on : str, optional.
+        The identifier used to align a DataFrame `rep_wts`. The default
+        is 'id'.
+    fay : float, optional.
+        Fay's coefficient. The default is 0.5, as for RECS.
+    level : float, optional.
+        Confidence level for the intervals. The default is 0.95.
+    variance : str, optional.
+        "brr" for replicate-weight standard errors or "linearization" for
+        Taylor linearization using only `weight` and the design variables.
+        The default is "brr".
+    strata, psu : str or None, optional.
+        Columns of `df` with design strata and PSUs, used only with
+        `variance="linearization"`. If None, a single stratum in which each
+        case is its own PSU; the public RECS files include no design
+        variables.
+
+    Returns
+    -------
+    A DataFrame indexed by domain and variable with columns `est`, `se`,
+    `lwr`, and `upr`.
+
+    """
+    variables = [variables] if isinstance(variables, str) else list(variables)
+    y = _columns(df, variables)
+    x = np.where(np.isnan(y), np.nan, 1.0)
+    est, se, levels = _ratio_estimates(
+        df, rep_wts, y, x, domain=domain, weight=weight, on=on, fay=fay,
+        variance=variance, strata=strata, psu=psu
+    )
+    return(_estimate_frame(est, se, levels, variables, domain, level))
+
+# domain ratios
+def domain_ratios(
+    df,
+    rep_wts,
+    num_vars,
+    den_vars,
+    domain=None,
+    weight='weight',
+    on='id',
+    fay=0.5,
+    level=0.95,
+    variance='brr',
+    strata=None,
+    psu=None
+):
+    """
+    Estimate ratios of weighted totals with replicate-weight standard errors.
+
+    Each ratio is sum(w * y) / sum(w * x) within a domain, using only cases
+    where both y and x are observed. Numerators and denominators for every
+    ratio, domain, and replicate come from the same sparse products used by
+    `domain_means()`.
+
+    Parameters
+    ----------
+    df, rep_wts, domain, weight, on, fay, level, variance, strata, psu :
+        See `domain_means()`.
+    num_vars : str or sequence of str.
+        Numeric columns forming the numerators, y.
+    den_vars : str or sequence of str.
+        Numeric columns forming the denominators, x, paired with
+        `num_vars`.
+
+    Returns
+    -------
+    A DataFrame indexed by domain and ratio (labeled "y/x") with columns
+    `est`, `se`, `lwr`, and `upr`.
+
+    """
+    num_vars = [num_vars] if isinstance(num_vars, str) else list(num_vars)
+    den_vars = [den_vars] if isinstance(den_vars, str) else list(den_vars)
+    if len(num_vars) != len(den_vars):
+        raise ValueError("num_vars and den_vars should have equal length.")
+    y, x = _columns(df, num_vars), _columns(df, den_vars)
+    miss = np.logical_or(np.isnan(y), np.isnan(x))
+    y[miss], x[miss] = np.nan, np.nan
+    est, se, levels = _ratio_estimates(
+        df, rep_wts, y, x, domain=domain, weight=weight, on=on, fay=fay,
+        variance=variance, strata=strata, psu=psu
+    )
+    labels = [a + '/' + b for a, b in zip(num_vars, den_vars)]
+    return(_estimate_frame(est, se, levels, labels, domain, level))
+
+# replicate quantiles for a single variable
+def _replicate_quantiles(x, wts, codes, k, probs):
+    """
+    Compute weighted quantiles of `x` by domain under every weight column.
+
+    Cases are sorted once by domain and value, so each domain is a
+    contiguous block. A single 2-d cumulative sum over the sorted weight
+    matrix gives the cumulative weight curves for all replicates, from
+    which every replicate quantile is read off together. The q-quantile is
+    the smallest value whose cumulative weight reaches q times the total.
+
+    Returns
+    -------
+    An array of shape (len(probs), k, R + 1).
+
+    """
+    ok = np.logical_and(codes >= 0, ~np.isnan(x))
+    x, wts, codes = x[ok], wts[ok], codes[ok]
+    order = np.lexsort((x, codes))
+    x, wts, codes = x[order], wts[order], codes[order]
+    cw = np.cumsum(wts, axis=0)
+
+    out = np.full((len(probs), k, wts.shape[1]), np.nan)
+    bounds = np.searchsorted(codes, np.arange(k + 1))
+    for d in range(k):
+        a, b = bounds[d], bounds[d + 1]
+        if a == b:
+            continue
+        curve = cw[a:b] - (cw[a - 1] if a > 0 else 0)
+        for j, q in enumerate(probs):
+            idx = np.sum(curve < q * curve[-1], axis=0)
+            out[j, d] = x[a + np.minimum(idx, b - a - 1)]
+    return(out)
+
+# domain quantiles
+def domain_quantiles(
+    df,
+    rep_wts,
+    variables,
+    probs=(0.5,),
+    domain=None,
+    weight='weight',
+    on='id',
+    fay=0.5,
+    level=0.95
+):
+    """
+    Estimate weighted quantiles with replicate-weight standard errors.
+
+    Each variable is sorted once and the quantiles for all domains,
+    probabilities, and replicates are read from cumulative weight curves,
+    see `_replicate_quantiles()`.
+
+    Parameters
+    ----------
+    df, rep_wts, variables, domain, weight, on, fay, level :
+        See `domain_means()`.
+    probs : sequence of floats, optional.
+        Probabilities of the quantiles to estimate, in (0, 1). The default
+        estimates the median only.
+
+    Returns
+    -------
+    A DataFrame indexed by domain and quantile (labeled e.g. "hdd65_q50"
+    for the median of hdd65) with columns `est`, `se`, `lwr`, and `upr`.
+
+    """
+    variables = [variables] if isinstance(variables, str) else list(variables)
+    wts = _weight_matrix(df, rep_wts, weight=weight, on=on)
+    codes, levels = _domain_codes(df, domain)
+    x = _columns(df, variables)
+    theta = np.concatenate([
+        _replicate_quantiles(x[:, i], wts, codes, len(levels), probs)
+        for i in range(len(variables))
+    ])
+    se = _replicate_se(theta, fay=fay)
+    labels = [
+        '{0}_q{1:g}'.format(v, 100 * q) for v in variables for q in probs
+    ]
+    return(_estimate_frame(theta[..., 0], se, levels, labels, domain, level))
+
+# contrasts across survey waves
+def wave_contrasts(estimates, contrasts=None, level=0.95):
+    """
+    Estimate linear contrasts of estimates from independent survey waves.
+
+    Each wave is summarized separately, with its own replicate scheme (e.g.
+    244 replicates with Fay's coefficient for 2009 RECS and 96 for 2015),
+    by `domain_means()` or another estimator from this module. The waves
+    are aligned on their (domain, variable) index into (N, W) arrays of
+    estimates and standard errors, and all contrasts are formed by a single
+    matrix product. Waves are independent samples, so a contrast
+    sum_w c_w * theta_w has standard error sqrt(sum_w c_w^2 * se_w^2).
+
+    Parameters
+    ----------
+    estimates : dict.
+        Maps wave labels to DataFrames of estimates with columns `est` and
+        `se`, as returned by `domain_means()`.
+    contrasts : dict or None, optional.
+        Maps contrast labels to dicts of coefficients by wave label, e.g.
+        {'2015 - 2009': {2015: 1, 2009: -1}}. Waves not listed have
+        coefficient 0. The default, None, gives differences between each
+        wave and the one before it, in the order of `estimates`.
+    level : float, optional.
+        Confidence level for the intervals. The default is 0.95.
+
+    Returns
+    -------
+    A DataFrame indexed by contrast, domain, and variable with columns
+    `est`, `se`, `lwr`, and `upr`. Rows missing from a wave used by a
+    contrast are NaN.
+
+    """
+    waves = list(estimates.keys())
+    if contrasts is None:
+        contrasts = {
+            '{0} - {1}'.format(b, a): {b: 1, a: -1}
+            for a, b in zip(waves[:-1], waves[1:])
+        }
+    c = np.zeros((len(contrasts), len(waves)))
+    for i, coef in enumerate(contrasts.values()):
+        for w, v in coef.items():
+            c[i, waves.index(w)] = v
+
+    # align the waves
+    idx = estimates[waves[0]].index
+    for w in waves[1:]:
+        idx = idx.union(estimates[w].index, sort=False)
+    est = np.column_stack(
+        [estimates[w]['est'].reindex(idx).to_numpy() for w in waves]
+    )
+    se = np.column_stack(
+        [estimates[w]['se'].reindex(idx).to_numpy() for w in waves]
+    )
+
+    # all contrasts at once, unused waves do not propagate missing values
+    used = (c != 0)[None]
+    est = np.where(used, est[:, None, :] * c[None], 0).sum(axis=2)
+    var = np.where(used, (se[:, None, :] * c[None]) ** 2, 0).sum(axis=2)
+
+    z = norm.ppf(1 - (1 - level) / 2)
+    est, se = est.T.ravel(), np.sqrt(var).T.ravel()
+    index = pd.MultiIndex.from_tuples(
+        [(k,) + tuple(i) for k in contrasts for i in idx],
+        names=['contrast'] + list(idx.names)
+    )
+    return(pd.DataFrame(
+        {'est': est, 'se': se, 'lwr': est - z * se, 'upr': est + z * se},
+        index=index
+    ))
+
+# 79: -------------------------------------------------------------------------
@@ -10,15 +10,20 @@ Updated: October 18, 2021
 # 79: -------------------------------------------------------------------------
 
 # imports
+import warnings
 import numpy as np
-from scipy.stats import norm, beta
+import pandas as pd
+from collections import OrderedDict
+from scipy.stats import norm, beta, binom
 
 # confidence interval for a mean
 def ci_mean(
     x,
     axis=0,
     level=0.95,
-    str_fmt="{mean:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]"
+    str_fmt="{mean:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+    output=None,
+    chunk_bytes=None
 ):
     """
     Construct an estimate and confidence interval for the mean of `x`.
@@ -39,49 +44,56 @@ def ci_mean(
         lower and upper confidence bounds, respectively. If a string, it's the
         result of calling the `.format_map()` method using this dictionary.
         The default is "{mean:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]".
+    output: str or None, optional.
+        Use "frame" for a tidy DataFrame with one row per estimate (and a
+        `ci` column of formatted strings unless `str_fmt` is None), or
+        "lazy" for a `CIResult` that formats intervals only when they are
+        accessed. The default, None, returns strings or a dictionary.
+    chunk_bytes: int or None, optional.
+        If given, reduce `x` in contiguous blocks, e.g. row slabs of a
+        C-ordered array, each using at most about this many bytes, so that
+        temporaries stay small and a memory-mapped file is read once. Slabs
+        along `axis` are combined as in `MeanAccumulator`. `x` may then be
+        an `np.memmap` or another ndarray-like object with `.shape`,
+        `.dtype`, and tuple indexing; other inputs are converted with
+        `np.asarray()`. Results agree with the in-memory path to
+        floating-point precision, though summation order can differ in the
+        last bits. The default is None.
 
     Returns
     -------
     By default, the function returns a string with a 95% confidence interval
     in the form "mean [95% CI: (lwr, upr)]". A dictionary containing the mean,
     confidence level, lower, bound, and upper bound can also be returned.
+    See `output` for the DataFrame and lazy alternatives.
 
     """
     # check input
-    try:
-        x = np.asarray(x)  # or np.array() as instructed.
-    except TypeError:
-        print("Could not convert x to type ndarray.")
+    if chunk_bytes is None or not _is_sliceable(x):
+        try:
+            x = np.asarray(x)  # or np.array() as instructed.
+        except TypeError:
+            print("Could not convert x to type ndarray.")
 
     # construct estimates
-    xbar = np.mean(x, axis=axis)
-    se = np.std(x, axis=axis, ddof=1) / np.sqrt(x.shape[axis])
-    z = norm.ppf(1 - (1 - level) / 2)
-    lwr, upr = xbar - z * se, xbar + z * se
-    out = {"mean": xbar, "level": 100 * level, "lwr": lwr, "upr": upr}
+    xbar, sd = _chunked_reduce(
+        x, axis, _mean_sd, chunk_bytes, slab_func=_mean_sd_slabs
+    )
+    se = sd / np.sqrt(x.shape[axis])
+    out = _mean_ci(xbar, se, level=level)
     # format output
-    if str_fmt is None:
-        return(out)
-    elif xbar.size == 1:
-        return(str_fmt.format_map(out))
-    else: 
-        m = len(xbar)
-        out2 = {i: 
-                {"mean": xbar[i],
-                 "level": 100 * level,
-                 "lwr": lwr[i],
-                 "upr": upr[i]
-                } for i in range(m)}
-        return([str_fmt.format_map(out2[i]) for i in range(m)])
+    return(_format_ci(out, str_fmt, est="mean", output=output))
 
 # confidence interval for a proportion
 def ci_prop(
     x,
     axis=0,
     level=0.95,
-    str_fmt="{mean:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+    str_fmt="{est:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
     method="Normal",
-    warn=True
+    warn=True,
+    output=None,
+    chunk_bytes=None
 ):
     """
     Construct point and interval estimates for a population proportion.
@@ -107,93 +119,1127 @@ def ci_prop(
         Axis along which to compute the means and std of x. The default is 0.
         Has only been tested for axis=0 and axis=1 in a 2d array. 
     str_fmt: str or None, optional.
-        If `None` a dictionary with entries `mean`, `level`, `lwr`, and
+        If `None` a dictionary with entries `est`, `level`, `lwr`, and
         `upr` whose values give the point estimate, confidence level (as a %),
         lower and upper confidence bounds, respectively. If a string, it's the
         result of calling the `.format_map()` method using this dictionary.
-        The default is "{mean:.1f} [{level:0.f}%: ({lwr:.1f}, {upr:.1f})]".
-    method: str, optional
+        The default is "{est:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]".
+    method: str or list of str, optional
         The type of confidence interval and point estimate desired.  Allowed
         values are "Normal" for the normal approximation to the Binomial,
         "CP" for a Clopper-Pearson interval, "Jeffrey" for Jeffrey's method,
-        or "AC" for the Agresti-Coull estimates.
+        or "AC" for the Agresti-Coull estimates. A list of these, or "all"
+        for ["Normal", "AC", "CP", "Jeffrey"], computes several methods from
+        a single pass over `x`.
     warn: bool, optional
         Whether to issue a warning when using the normal approximation and 
         the assumption that there are at least 12 ones and zeros is not met.  
         The default is True. 
+    output: str or None, optional.
+        Return a tidy DataFrame ("frame") or lazily formatted `CIResult`
+        ("lazy") rather than strings, see `ci_mean()`.
+    chunk_bytes: int or None, optional.
+        If given, check and sum `x` in blocks of at most about this many
+        bytes, see `ci_mean()`. The default is None.
 
     Returns
     -------
     A string with a (100 * level)% confidence interval in the form
     "mean [(100 * level)% CI: (lwr, upr)]" or a dictionary containing the
-    keywords shown in the string.
+    keywords shown in the string. When several methods are requested, a
+    dictionary keyed by method of the formatted strings or, if `str_fmt` is
+    None, a structured array with fields `method`, `est`, `level`, `lwr`,
+    and `upr` and one row (along the first axis) per method.
 
     """
     # check input type
+    if chunk_bytes is None or not _is_sliceable(x):
+        try:
+            x = np.asarray(x)  # or np.array() as instructed.
+        except TypeError:
+            print("Could not convert x to type ndarray.")
+
+    # check method
+    methods = _check_methods(method)
+
+    # determine the length and number of successes, checking x is 0/1
+    n = x.shape[axis]
+    s, = _chunked_reduce(
+        x, axis, _binary_sum, chunk_bytes, slab_func=_binary_sum_slabs
+    )
+
+    # compute estimates and bounds for several methods
+    if methods is not None:
+        out = _prop_ci_methods(s, n, level=level, methods=methods, warn=warn)
+        return(_format_ci_methods(out, str_fmt, output=output))
+
+    # compute estimates and bounds
+    out = _prop_ci(s, n, level=level, method=method, warn=warn)
+
+    # prepare return values
+    return(_format_ci(out, str_fmt, est="est", output=output))
+
+# confidence interval for a proportion from counts
+def ci_prop_counts(
+    s,
+    n,
+    level=0.95,
+    str_fmt="{est:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+    method="Normal",
+    warn=True,
+    output=None
+):
+    """
+    Construct point and interval estimates for a proportion from counts.
+
+    This is the sufficient-statistic form of `ci_prop()`: rather than a
+    0/1 data array, it takes the number of successes `s` and the number of
+    trials `n`. The two are broadcast against one another, so a vector of
+    success counts can share a single `n`, or counts aggregated from a
+    table (or a database group-by) can be passed directly.
+
+    Parameters
+    ----------
+    s : int or array-like of ints.
+        The number(s) of successes.
+    n : int or array-like of ints.
+        The number(s) of trials, broadcastable against `s`.
+    level : float, optional.
+        The desired confidence level, converted to a percent in the output.
+        The default is 0.95.
+    str_fmt: str or None, optional.
+        If `None` a dictionary with entries `est`, `level`, `lwr`, and
+        `upr` whose values give the point estimate, confidence level (as a %),
+        lower and upper confidence bounds, respectively. If a string, it's the
+        result of calling the `.format_map()` method using this dictionary.
+        The default is "{est:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]".
+    method: str or list of str, optional
+        The type of confidence interval and point estimate desired, as in
+        `ci_prop()`: "Normal", "CP", "Jeffrey", "AC", a list of these, or
+        "all".
+    warn: bool, optional
+        Whether to issue a warning when using the normal approximation and
+        the assumption that there are at least 12 successes and failures is
+        not met. The default is True.
+    output: str or None, optional.
+        Return a tidy DataFrame ("frame") or lazily formatted `CIResult`
+        ("lazy") rather than strings, see `ci_mean()`.
+
+    Returns
+    -------
+    The same string, list of strings, dictionary, or (for several methods)
+    structured array returned by `ci_prop()`, with entries having the
+    broadcast shape of `s` and `n`.
+
+    """
+    # check input
+    s, n = np.broadcast_arrays(np.asarray(s), np.asarray(n))
+    if np.any(n <= 0) or np.any(s < 0) or np.any(s > n):
+        raise ValueError("Counts should satisfy 0 <= s <= n and n > 0.")
+    methods = _check_methods(method)
+
+    # compute estimates and bounds for several methods
+    if methods is not None:
+        out = _prop_ci_methods(s, n, level=level, methods=methods, warn=warn)
+        return(_format_ci_methods(out, str_fmt, output=output))
+
+    # compute estimates and bounds
+    out = _prop_ci(s, n, level=level, method=method, warn=warn)
+
+    # prepare return values
+    return(_format_ci(out, str_fmt, est="est", output=output))
+
+# exact coverage and expected width of proportion intervals
+def ci_prop_coverage(n, p, level=0.95, method="Normal"):
+    """
+    Compute the exact coverage and expected width of `ci_prop()` intervals.
+
+    Rather than estimating these by Monte Carlo, enumerate the possible
+    numbers of successes s = 0, ..., n and weight the interval for each by
+    the Binomial(n, p) probability of observing s. As in the simulation
+    study from problem set 4, undefined (NaN) lower and upper bounds are
+    treated as 0 and 1, respectively, and an interval covers p when
+    lwr < p < upr.
+
+    Parameters
+    ----------
+    n : int or array-like of ints.
+        Sample size(s).
+    p : float or array-like of floats.
+        Population proportion(s), broadcastable against `n`.
+    level : float or array-like of floats, optional.
+        Nominal confidence level(s), broadcastable against `n` and `p`.
+        The default is 0.95.
+    method: str, optional
+        The interval method, as in `ci_prop()`: "Normal", "CP", "Jeffrey",
+        or "AC". The default is "Normal".
+
+    Returns
+    -------
+    A dictionary with entries `coverage` and `width` giving the exact
+    coverage probability and expected interval width, each having the
+    broadcast shape of `n`, `p`, and `level`.
+
+    """
+    # check input
+    n, p, level = np.broadcast_arrays(
+        np.asarray(n), np.asarray(p, dtype='float64'), np.asarray(level)
+    )
+    if np.any(n <= 0) or np.any(p < 0) or np.any(p > 1):
+        raise ValueError("Requires n > 0 and 0 <= p <= 1.")
+
+    # enumerate successes along a new last axis, padding beyond each n
+    s = np.arange(np.max(n) + 1)
+    n, p, level = n[..., None], p[..., None], level[..., None]
+    s, n = np.broadcast_arrays(s, n)
+    valid = s <= n
+    s = np.where(valid, s, n)
+    pmf = np.where(valid, binom.pmf(s, n, p), 0)
+
+    # intervals for every possible outcome
+    out = _prop_ci(s, n, level=level, method=method, warn=False)
+    lwr = np.nan_to_num(out['lwr'], nan=0.0)
+    upr = np.nan_to_num(out['upr'], nan=1.0)
+
+    # weight by the probability of each outcome
+    covered = np.logical_and(lwr < p, upr > p)
+    coverage = np.sum(pmf * covered, axis=-1)
+    width = np.sum(pmf * (upr - lwr), axis=-1)
+    return({"coverage": coverage[()], "width": width[()]})
+
+# design-based confidence interval for a mean
+def ci_mean_svy(
+    x,
+    weights,
+    strata=None,
+    psu=None,
+    level=0.95,
+    str_fmt="{mean:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+    output=None
+):
+    """
+    Construct survey-weighted estimates and intervals for the mean of `x`.
+
+    The point estimate is the weighted mean and its variance is estimated
+    by Taylor linearization, treating PSUs as sampled with replacement
+    within strata (as for NHANES `exam_wt`, `psu`, and `strata`). Several
+    variables, the columns of a 2-d `x`, are handled in a single pass.
+    Missing values (NaN) are excluded variable by variable.
+
+    Parameters
+    ----------
+    x : array-like, 1 or 2-dimensional.
+        Data with one row per respondent and, if 2-d, one column per
+        variable.
+    weights : array-like.
+        Sampling weights, one per row of `x`.
+    strata : array-like or None, optional.
+        Stratum labels, one per row of `x`. If None, a single stratum.
+    psu : array-like or None, optional.
+        Primary sampling unit labels (nested within strata). If None, each
+        respondent is its own PSU.
+    level, str_fmt, output :
+        See `ci_mean()`.
+
+    Returns
+    -------
+    The same string, list of strings, dictionary, or other output as
+    `ci_mean()`, with one estimate per variable.
+
+    """
+    x, weights, valid = _svy_input(x, weights)
+    xbar, var, _ = _svy_mean(x, weights, valid, strata, psu)
+    out = _mean_ci(xbar, np.sqrt(var), level=level)
+    return(_format_ci(out, str_fmt, est="mean", output=output))
+
+# design-based confidence interval for a proportion
+def ci_prop_svy(
+    x,
+    weights,
+    strata=None,
+    psu=None,
+    level=0.95,
+    str_fmt="{est:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+    method="Normal",
+    output=None
+):
+    """
+    Construct survey-weighted estimates and intervals for proportions.
+
+    As in `ci_mean_svy()`, the estimate is the weighted proportion with a
+    linearized design-based variance. The "Normal" method uses this
+    variance directly. Other methods replace n with the effective sample
+    size p(1 - p) / var (Korn and Graubard, 1998) in the formulas used by
+    `ci_prop()`.
+
+    Parameters
+    ----------
+    x : array-like, 1 or 2-dimensional.
+        0/1 or boolean data with one row per respondent and, if 2-d, one
+        column per variable. Missing values (NaN) are excluded.
+    weights, strata, psu :
+        See `ci_mean_svy()`.
+    level, str_fmt, method, output :
+        See `ci_prop()`.
+
+    Returns
+    -------
+    The same output as `ci_prop()`, with one estimate per variable.
+
+    """
+    x, weights, valid = _svy_input(x, weights)
+    _check_binary(x[valid])
+    methods = _check_methods(method)
+
+    # effective sample sizes
+    est, var, n = _svy_mean(x, weights, valid, strata, psu)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n_eff = np.where(var > 0, est * (1 - est) / var, n)
+    s_eff = est * n_eff
+
+    # compute estimates and bounds
+    if methods is not None:
+        out = _prop_ci_methods(s_eff, n_eff, level, methods, warn=False)
+        return(_format_ci_methods(out, str_fmt, output=output))
+    out = _prop_ci(s_eff, n_eff, level=level, method=method, warn=False)
+    return(_format_ci(out, str_fmt, est="est", output=output))
+
+# linearized variance of estimated totals
+def linearized_var(scores, strata=None, psu=None):
+    """
+    Estimate the design variance of the totals of `scores`.
+
+    PSU totals are formed with grouped sums (`np.add.reduceat`) after a
+    single sort by stratum and PSU, then the variance is
+
+        sum_h n_h / (n_h - 1) sum_j (t_hj - tbar_h)^2
+
+    where t_hj is the total for PSU j in stratum h and n_h the number of
+    PSUs in stratum h. Strata with a single PSU contribute zero. Applied to
+    linearization scores (influence values), this gives Taylor-series
+    variance estimates for means and ratios.
+
+    Parameters
+    ----------
+    scores : array-like, 1 or 2-dimensional.
+        Values to total with one row per respondent; columns are handled
+        independently.
+    strata : array-like or None, optional.
+        Stratum labels. If None, a single stratum.
+    psu : array-like or None, optional.
+        PSU labels. If None, each respondent is its own PSU.
+
+    Returns
+    -------
+    An array of variances, one per column of `scores`.
+
+    """
+    scores = np.asarray(scores, dtype='float64')
+    n = scores.shape[0]
+    strata = np.zeros(n) if strata is None else np.asarray(strata)
+    psu = np.arange(n) if psu is None else np.asarray(psu)
+
+    # sort once, then total by PSU
+    order = np.lexsort((psu, strata))
+    st, ps = strata[order], psu[order]
+    new_psu = np.ones(n, dtype='bool')
+    new_psu[1:] = np.logical_or(st[1:] != st[:-1], ps[1:] != ps[:-1])
+    starts = np.flatnonzero(new_psu)
+    t = np.add.reduceat(scores[order], starts, axis=0)
+
+    # deviations of PSU totals from their stratum means
+    st = st[starts]
+    new_st = np.ones(len(st), dtype='bool')
+    new_st[1:] = st[1:] != st[:-1]
+    st_starts = np.flatnonzero(new_st)
+    n_h = np.diff(np.append(st_starts, len(st)))
+    t_bar = np.add.reduceat(t, st_starts, axis=0) / _expand(n_h, t.ndim)
+    dev = t - np.repeat(t_bar, n_h, axis=0)
+    ss = np.add.reduceat(dev ** 2, st_starts, axis=0)
+
+    # combine strata
+    f = np.where(n_h > 1, n_h / np.maximum(n_h - 1, 1), 0)
+    return(np.sum(_expand(f, ss.ndim) * ss, axis=0))
+
+# streaming estimates for a mean
+class MeanAccumulator:
+    """
+    Accumulate the mean and variance of data arriving in chunks.
+
+    Chunks are combined with the parallel form of Welford's algorithm, so
+    data can be streamed from a generator or a memory-mapped file, and
+    accumulators filled in different processes can be merged. Calling
+    `.ci()` gives the same output as `ci_mean()` on the concatenated data.
+
+    Parameters
+    ----------
+    axis : int, optional.
+        The axis of each chunk indexing observations; chunks are stacked
+        along this axis. The default is 0.
+    """
+
+    def __init__(self, axis=0):
+        self.axis = axis
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _combine(self, n, mean, m2):
+        # Chan et al.'s pairwise update of count, mean, and sum of squares
+        if n == 0:
+            return(self)
+        tot = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / tot
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * n / tot
+        self.n = tot
+        return(self)
+
+    def update(self, chunk):
+        """
+        Add a chunk of observations and return the updated accumulator.
+        """
+        chunk = np.asarray(chunk)
+        mean = np.mean(chunk, axis=self.axis)
+        m2 = np.sum(
+            (chunk - np.expand_dims(mean, self.axis)) ** 2, axis=self.axis
+        )
+        return(self._combine(chunk.shape[self.axis], mean, m2))
+
+    def consume(self, chunks):
+        """
+        Add every chunk from an iterable and return the accumulator.
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return(self)
+
+    def merge(self, other):
+        """
+        Merge the state of another `MeanAccumulator` into this one.
+        """
+        return(self._combine(other.n, other.mean, other.m2))
+
+    def ci(
+        self,
+        level=0.95,
+        str_fmt="{mean:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+        output=None
+    ):
+        """
+        Form estimates and confidence intervals, see `ci_mean()`.
+        """
+        se = np.sqrt(self.m2 / (self.n - 1)) / np.sqrt(self.n)
+        out = _mean_ci(self.mean, se, level=level)
+        return(_format_ci(out, str_fmt, est="mean", output=output))
+
+# streaming estimates for a proportion
+class PropAccumulator:
+    """
+    Accumulate success and trial counts from 0/1 data arriving in chunks.
+
+    Like `MeanAccumulator`, chunks can come from a generator or memory-mapped
+    file and accumulators can be merged across processes. Calling `.ci()`
+    gives the same output as `ci_prop()` on the concatenated data.
+
+    Parameters
+    ----------
+    axis : int, optional.
+        The axis of each chunk indexing observations; chunks are stacked
+        along this axis. The default is 0.
+    """
+
+    def __init__(self, axis=0):
+        self.axis = axis
+        self.n = 0
+        self.s = 0
+
+    def update(self, chunk):
+        """
+        Add a chunk of 0/1 observations and return the updated accumulator.
+        """
+        chunk = np.asarray(chunk)
+        _check_binary(chunk)
+        self.n += chunk.shape[self.axis]
+        self.s = self.s + np.sum(chunk, axis=self.axis)
+        return(self)
+
+    def consume(self, chunks):
+        """
+        Add every chunk from an iterable and return the accumulator.
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return(self)
+
+    def merge(self, other):
+        """
+        Merge the state of another `PropAccumulator` into this one.
+        """
+        self.n += other.n
+        self.s = self.s + other.s
+        return(self)
+
+    def ci(
+        self,
+        level=0.95,
+        str_fmt="{est:.2f} [{level:.0f}%: ({lwr:.2f}, {upr:.2f})]",
+        method="Normal",
+        warn=True,
+        output=None
+    ):
+        """
+        Form estimates and confidence intervals, see `ci_prop()`.
+        """
+        return(ci_prop_counts(
+            self.s,
+            self.n,
+            level=level,
+            str_fmt=str_fmt,
+            method=method,
+            warn=warn,
+            output=output
+        ))
+
+# prepare survey data
+def _svy_input(x, weights):
+    """
+    Convert survey data and weights to arrays and flag non-missing values.
+    """
+    x = np.asarray(x, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    if weights.shape != x.shape[:1]:
+        raise ValueError("weights should have one entry per row of x.")
+    return((x, weights, ~np.isnan(x)))
+
+# weighted means and their linearized variances
+def _svy_mean(x, weights, valid, strata=None, psu=None):
+    """
+    Compute weighted means of `x` and their linearized variances.
+
+    Returns
+    -------
+    A tuple (est, var, n) with the weighted means, their variances, and
+    the number of non-missing values.
+
+    """
+    w = _expand(weights, x.ndim) * valid
+    x0 = np.where(valid, x, 0)
+    w_tot = np.sum(w, axis=0)
+    est = np.sum(w * x0, axis=0) / w_tot
+    scores = w * (x0 - est) / w_tot
+    var = linearized_var(scores, strata, psu)
+    return((est, var, np.sum(valid, axis=0)))
+
+# broadcast a vector against the leading axis
+def _expand(v, ndim):
+    """
+    Reshape the vector `v` to have `ndim` dimensions along axis 0.
+    """
+    return(np.reshape(v, np.shape(v) + (1,) * (ndim - 1)))
+
+# shared computations for ci_mean and MeanAccumulator
+def _mean_ci(xbar, se, level=0.95):
+    """
+    Compute normal-theory bounds for a mean from its estimate and se.
+
+    Returns
+    -------
+    A dictionary with entries `mean`, `level`, `lwr`, and `upr`.
+
+    """
+    z = norm.ppf(1 - (1 - level) / 2)
+    lwr, upr = xbar - z * se, xbar + z * se
+    return({"mean": xbar, "level": 100 * level, "lwr": lwr, "upr": upr})
+
+# reductions for ci_mean and ci_prop
+def _mean_sd(x, axis):
+    """
+    Return the mean and standard deviation (ddof=1) of `x` along `axis`.
+    """
+    return((np.mean(x, axis=axis), np.std(x, axis=axis, ddof=1)))
+
+def _binary_sum(x, axis):
+    """
+    Check that `x` is 0/1 and return its sum along `axis` in a tuple.
+    """
+    _check_binary(x)
+    return((np.sum(x, axis=axis),))
+
+def _is_sliceable(x):
+    """
+    Check whether `x` is ndarray-like and can be sliced without conversion.
+
+    This requires `.shape`, `.ndim`, and `.dtype` and tuple indexing, as
+    for an ndarray or `np.memmap`; a DataFrame, for one, is converted.
+    """
+    if not all(hasattr(x, a) for a in ('shape', 'ndim', 'dtype')):
+        return(False)
     try:
-        x = np.asarray(x)  # or np.array() as instructed.
-    except TypeError:
-        print("Could not convert x to type ndarray.")
+        np.dtype(x.dtype)
+        x[(slice(0, 0),) * x.ndim]
+    except (TypeError, KeyError, IndexError, ValueError):
+        return(False)
+    return(True)
+
+# reductions over contiguous slabs, combined by the accumulators
+def _mean_sd_slabs(blocks, axis):
+    """
+    Return the mean and standard deviation (ddof=1) of `blocks` stacked
+    along `axis`, combined with Chan et al.'s pairwise update.
+    """
+    acc = MeanAccumulator(axis=axis).consume(blocks)
+    return((acc.mean, np.sqrt(acc.m2 / (acc.n - 1))))
 
-    # check that x is bool or 0/1
+def _binary_sum_slabs(blocks, axis):
+    """
+    Check that `blocks` are 0/1 and return their total along `axis`.
+    """
+    return((PropAccumulator(axis=axis).consume(blocks).s,))
+
+# blockwise reductions with a bounded working set
+def _block_axis(x):
+    """
+    Return the axis of `x` with the largest stride, along which blocks are
+    contiguous; arrays without strides are taken to be in C order.
+    """
+    strides = getattr(x, 'strides', None)
+    if strides is None:
+        return(0)
+    axes = [j for j in range(len(x.shape)) if x.shape[j] > 1] or [0]
+    return(max(axes, key=lambda j: abs(strides[j])))
+
+def _chunked_reduce(x, axis, func, chunk_bytes=None, slab_func=None):
+    """
+    Apply a reduction to blocks of `x` read along its outermost axis.
+
+    Blocks are taken along the axis with the largest stride, so each block
+    is a contiguous slab of a C- or Fortran-ordered array or memmap and
+    the data are read once. When that axis is not reduced, `func` is
+    applied to each block and the results concatenated; otherwise, the
+    blocks are passed to `slab_func` to be combined.
+
+    Parameters
+    ----------
+    x : ndarray, np.memmap, or sliceable array-like.
+        The data to reduce.
+    axis : int.
+        The axis to reduce over.
+    func : callable.
+        Called as `func(block, axis)` and returning a tuple of arrays
+        reduced over `axis`.
+    chunk_bytes : int or None, optional.
+        Approximate maximum size of each block. If None, `func` is applied
+        to all of `x` at once.
+    slab_func : callable or None, optional.
+        Called as `slab_func(blocks, axis)` with an iterator of blocks
+        split along `axis` and returning the same tuple as `func`; needed
+        when `axis` is the outermost axis.
+
+    Returns
+    -------
+    The tuple returned by `func`, with blocks concatenated or combined.
+
+    """
+    ndim = len(x.shape)
+    axis = axis % ndim
+    if chunk_bytes is None:
+        return(func(np.asarray(x), axis))
+
+    # size blocks along the outermost axis
+    b_axis = _block_axis(x)
+    itemsize = np.dtype(x.dtype).itemsize
+    b_bytes = itemsize * int(np.prod(x.shape)) // max(x.shape[b_axis], 1)
+    step = max(1, chunk_bytes // max(b_bytes, 1))
+
+    def _blocks():
+        for start in range(0, x.shape[b_axis], step):
+            idx = [slice(None)] * ndim
+            idx[b_axis] = slice(start, start + step)
+            yield np.asarray(x[tuple(idx)])
+
+    # contiguous slabs along the reduced axis are combined
+    if b_axis == axis:
+        return(slab_func(_blocks(), axis))
+    blocks = [func(block, axis) for block in _blocks()]
+
+    # the block axis shifts down by one if it follows the reduced axis
+    out_axis = b_axis - 1 if b_axis > axis else b_axis
+    return(tuple(
+        np.concatenate([b[k] for b in blocks], axis=out_axis)
+        for k in range(len(blocks[0]))
+    ))
+
+# check for 0/1 data
+def _check_binary(x):
+    """
+    Raise a TypeError unless `x` is boolean or consists of 0's and 1's.
+    """
     if x.dtype is np.dtype('bool'):
         pass
     elif not np.logical_or(x == 0, x == 1).all():
         raise TypeError("x should be dtype('bool') or all 0's and 1's.")
 
+# shared computations for ci_prop and ci_prop_counts
+def _prop_ci(s, n, level=0.95, method="Normal", warn=True, z=None):
+    """
+    Compute a proportion's estimate and bounds from successes and trials.
+
+    Parameters
+    ----------
+    s, n : int or ndarray.
+        The number of successes and trials, broadcastable to a common shape.
+    level, method, warn :
+        See `ci_prop()`.
+    z : float or None, optional.
+        The normal quantile for `level`, computed if None.
+
+    Returns
+    -------
+    A dictionary with entries `est`, `level`, `lwr`, and `upr`.
+
+    """
     # check method
     assert method in ["Normal", "CP", "Jeffrey", "AC"]
 
-    # determine the length
-    n = x.shape[axis]
+    if z is None:
+        z = norm.ppf(1 - (1 - level) / 2)
 
     # compute estimate
     if method == 'AC':
-        z = norm.ppf(1 - (1 - level) / 2)
         n = (n + z ** 2)
-        est = (np.sum(x, axis=axis) + z ** 2 / 2) / n
+        est = (s + z ** 2 / 2) / n
     else:
-        est = np.mean(x, axis=axis)
+        est = s / n
 
     # warn for small sample size with "Normal" method
     small_n = np.logical_or((n * est) < 12, (n * (1 - est)) < 12).any()
-    if warn == True and method == 'Normal' and small_n:
-        warn(Warning(
+    if warn and method == 'Normal' and small_n:
+        warnings.warn(Warning(
             "Normal approximation may be incorrect for n * min(p, 1-p) < 12."
         ))
 
     # compute bounds for Normal and AC methods
     if method in ['Normal', 'AC']:
         se = np.sqrt(est * (1 - est) / n)
-        z = norm.ppf(1 - (1 - level) / 2)
         lwr, upr = est - z * se, est + z * se
 
-    # compute bounds for CP method
+    # compute bounds for CP and Jeffrey methods, memoized by (s, n)
+    if method in ['CP', 'Jeffrey']:
+        lwr, upr = _bound_cache.bounds(s, n, level, method)
+
+    return({"est": est, "level": 100 * level, "lwr": lwr, "upr": upr})
+
+# check and expand the method argument
+def _check_methods(method):
+    """
+    Validate `method`, expanding "all" or a list into a tuple of methods.
+
+    Returns
+    -------
+    None for a single method, otherwise a tuple of method names.
+
+    """
+    valid = ["Normal", "AC", "CP", "Jeffrey"]
+    if isinstance(method, str) and method != "all":
+        assert method in valid
+        return(None)
+    methods = tuple(valid) if method == "all" else tuple(method)
+    assert all(m in valid for m in methods)
+    return(methods)
+
+# estimates and bounds for several methods at once
+def _prop_ci_methods(s, n, level=0.95, methods=("Normal",), warn=True):
+    """
+    Compute a proportion's estimate and bounds under several methods.
+
+    Parameters
+    ----------
+    s, n : int or ndarray.
+        The number of successes and trials, broadcastable to a common shape.
+    level, warn :
+        See `ci_prop()`.
+    methods : tuple of str.
+        The methods to compute.
+
+    Returns
+    -------
+    A structured array with fields `method`, `est`, `level`, `lwr`, and
+    `upr`, with shape (len(methods),) + the broadcast shape of s and n.
+
+    """
+    z = norm.ppf(1 - (1 - level) / 2)
+    shape = (len(methods),) + np.broadcast_shapes(np.shape(s), np.shape(n))
+    out = np.empty(shape, dtype=[
+        ('method', 'U7'),
+        ('est', 'f8'),
+        ('level', 'f8'),
+        ('lwr', 'f8'),
+        ('upr', 'f8')
+    ])
+    for k, method in enumerate(methods):
+        res = _prop_ci(s, n, level=level, method=method, warn=warn, z=z)
+        out['method'][k] = method
+        for name in ('est', 'level', 'lwr', 'upr'):
+            out[name][k] = res[name]
+    return(out)
+
+# beta quantile bounds for CP and Jeffrey methods
+def _beta_bounds(s, n, level, method):
+    """
+    Compute Clopper-Pearson or Jeffrey bounds using `beta.ppf()`.
+
+    Parameters
+    ----------
+    s, n, level : float or ndarray.
+        Successes, trials, and confidence levels; broadcast together.
+    method : str.
+        Either "CP" or "Jeffrey".
+
+    Returns
+    -------
+    A tuple (lwr, upr) of lower and upper confidence bounds.
+
+    """
+    alpha = 1 - level
     if method == 'CP':
-        alpha = 1 - level
-        s = np.sum(x, axis=axis)
         lwr = beta.ppf(alpha / 2, s, n - s + 1)
         upr = beta.ppf(1 - alpha / 2, s + 1, n - s)
-
-    # compute bounds for Jeffrey method
-    if method == 'Jeffrey':
-        alpha = 1 - level
-        s = np.sum(x, axis=axis)
+    else:
         lwr = beta.ppf(alpha / 2, s + 0.5, n - s + 0.5)
         upr = beta.ppf(1 - alpha / 2, s + 0.5, n - s + 0.5)
+    return((lwr, upr))
 
-    # prepare return values
-    out = {"est": est, "level": 100 * level, "lwr": lwr, "upr": upr}
+class _BoundCache:
+    """
+    A least-recently-used table of memoized beta quantile bounds.
+
+    Bounds are keyed by (s, n, level, method). Repeated calls, e.g. over
+    thousands of simulated columns whose successes take at most n + 1
+    distinct values, solve each unique key with `beta.ppf()` only once and
+    then gather the results by index. Once the table holds more than
+    `maxsize` entries, the least recently used are evicted.
+    """
+
+    def __init__(self, maxsize=2 ** 16):
+        self.maxsize = maxsize
+        self._table = OrderedDict()
+
+    def __len__(self):
+        return(len(self._table))
+
+    def clear(self):
+        self._table.clear()
+
+    def bounds(self, s, n, level, method):
+        """
+        Look up (computing where needed) bounds for arrays of s, n, level.
+
+        Parameters
+        ----------
+        s, n, level : float or ndarray.
+            Successes, trials, and confidence levels; broadcast together.
+        method : str.
+            Either "CP" or "Jeffrey".
+
+        Returns
+        -------
+        A tuple (lwr, upr) with the broadcast shape of the inputs.
+
+        """
+        s, n, level = np.broadcast_arrays(s, n, level)
+        shape = s.shape
+        s, n, level = s.ravel(), n.ravel(), level.ravel()
+        lwr, upr = np.empty(s.shape), np.empty(s.shape)
+
+        # levels are usually a scalar; otherwise handle each in turn
+        if level.size == 0 or np.all(level == level[0]):
+            groups = [(slice(None), level[:1])]
+        else:
+            lev, inv = np.unique(level, return_inverse=True)
+            inv = inv.ravel()
+            groups = [(inv == i, lev[i:(i + 1)]) for i in range(len(lev))]
+        for idx, lev in groups:
+            lwr[idx], upr[idx] = self._lookup(s[idx], n[idx], lev, method)
+        return((lwr.reshape(shape)[()], upr.reshape(shape)[()]))
+
+    def _lookup(self, s, n, level, method):
+        # bounds for 1-D s and n at a single level
+        if s.size == 0:
+            return((np.empty(0), np.empty(0)))
+        us, un, inv = _unique_pairs(s, n)
+        lv = float(level[0])
+        lwr, upr = np.empty(us.size), np.empty(us.size)
+
+        # gather cached bounds, noting those we need to compute
+        missing = []
+        for i, key in enumerate(zip(us.tolist(), un.tolist())):
+            key = key + (lv, method)
+            hit = self._table.get(key)
+            if hit is None:
+                missing.append(i)
+            else:
+                self._table.move_to_end(key)
+                lwr[i], upr[i] = hit
+
+        # solve for new keys in one vectorized call and cache them
+        if missing:
+            idx = np.asarray(missing)
+            lwr[idx], upr[idx] = _beta_bounds(us[idx], un[idx], lv, method)
+            for i in missing:
+                key = (us[i].item(), un[i].item(), lv, method)
+                self._table[key] = (lwr[i], upr[i])
+            while len(self._table) > self.maxsize:
+                self._table.popitem(last=False)
+        return((lwr[inv], upr[inv]))
+
+# unique (s, n) pairs
+def _unique_pairs(s, n):
+    """
+    Find the unique (s, n) pairs in 1-D arrays and the inverse index.
+
+    With a single n, the key is s alone; otherwise non-negative integer
+    counts are packed into one int64 key. Integer keys with a modest range
+    are deduplicated with `np.bincount` rather than sorting.
+
+    Returns
+    -------
+    A tuple (s, n, inv) of the unique pairs and the index of each input
+    pair among them.
+
+    """
+    s, n = s.astype('float64'), n.astype('float64')
+    if np.all(n == n[0]):
+        key, base = s, None
+    elif (np.all(s >= 0) and np.all(n >= 0) and
+          np.all(s == np.floor(s)) and np.all(n == np.floor(n))):
+        base = int(n.max()) + 1
+        key = s * base + n
+    else:
+        pairs = np.stack([s, n], axis=1)
+        uniq, inv = np.unique(pairs, axis=0, return_inverse=True)
+        return((uniq[:, 0], uniq[:, 1], inv.ravel()))
+
+    if (np.all(key >= 0) and np.all(key == np.floor(key)) and
+            key.max() < 4 * key.size + 2 ** 16):
+        ikey = key.astype('int64')
+        present = np.bincount(ikey) > 0
+        uniq = np.flatnonzero(present).astype('float64')
+        inv = (np.cumsum(present) - 1)[ikey]
+    else:
+        uniq, inv = np.unique(key, return_inverse=True)
+        inv = inv.ravel()
+    if base is None:
+        return((uniq, np.full(uniq.shape, n[0]), inv))
+    return((np.floor(uniq / base), uniq % base, inv))
+
+_bound_cache = _BoundCache()
+
+# lazily formatted estimates and bounds
+class CIResult:
+    """
+    Array-backed estimates and bounds formatted only when accessed.
+
+    Returned by the `ci_*()` functions when `output="lazy"`. Indexing,
+    iterating, or printing formats just the intervals involved, so the
+    display cost for many (e.g. 10,000) intervals is only paid for those
+    shown. The underlying arrays are available from `.out`.
+
+    Parameters
+    ----------
+    out : dict.
+        A dictionary with entries `est`, `level`, `lwr` and `upr`; the
+        name of the first entry is given by `est`.
+    str_fmt : str.
+        Passed to `.format_map()` for each estimate.
+    est : str, optional.
+        The key in `out` holding the point estimate(s).
+    """
+
+    def __init__(self, out, str_fmt, est="est"):
+        self.out = out
+        self.str_fmt = str_fmt
+        self.est = est
+
+    def __len__(self):
+        return(int(np.size(self.out[self.est])))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return(_ci_strings(self.out, self.str_fmt, self.est, i))
+        return(_ci_strings(self.out, self.str_fmt, self.est, [i])[0])
+
+    def __iter__(self):
+        m, step = len(self), 1000
+        for start in range(0, m, step):
+            yield from self[start:min(start + step, m)]
+
+    def __repr__(self):
+        m, k = len(self), 5
+        if m <= 2 * k:
+            rows = self[:]
+        else:
+            rows = self[:k] + ['...'] + self[-k:]
+        return('CIResult(m={0:d})\n'.format(m) + '\n'.join(rows))
+
+    def to_list(self):
+        """
+        Format all intervals as a list of strings.
+        """
+        return(self[:])
+
+    def to_series(self):
+        """
+        Format all intervals as a pandas string Series.
+        """
+        return(pd.Series(self.to_list(), dtype='string'))
+
+    def to_frame(self):
+        """
+        Return a tidy DataFrame, see `_ci_frame()`.
+        """
+        return(_ci_frame(self.out, self.str_fmt, self.est))
+
+# format selected estimates and bounds as strings
+def _ci_strings(out, str_fmt, est="est", idx=slice(None)):
+    """
+    Format the (flattened) intervals in `out` selected by `idx`.
+
+    The arrays are indexed and converted to Python floats with `.tolist()`
+    before formatting, which avoids the much slower formatting of NumPy
+    scalars one at a time.
+
+    Returns
+    -------
+    A list of strings.
+
+    """
+    shape = np.shape(out[est])
+    cols = [
+        np.ravel(np.broadcast_to(out[k], shape))[idx].tolist()
+        for k in (est, "level", "lwr", "upr")
+    ]
+    return([
+        str_fmt.format_map({est: e, "level": lv, "lwr": lwr, "upr": upr})
+        for e, lv, lwr, upr in zip(*cols)
+    ])
+
+# tidy DataFrame of estimates and bounds
+def _ci_frame(out, str_fmt=None, est="est"):
+    """
+    Organize estimates and bounds as a tidy DataFrame.
+
+    Parameters
+    ----------
+    out : dict or structured ndarray.
+        A dictionary as in `_format_ci()` or a structured array with one
+        row per method as from `_prop_ci_methods()`.
+    str_fmt : str or None, optional.
+        If given, a string column `ci` holds the formatted intervals.
+    est : str, optional.
+        The key in `out` holding the point estimate(s).
+
+    Returns
+    -------
+    A DataFrame with one row per interval and columns `est` (or `mean`),
+    `level`, `lwr`, and `upr`, plus `method` for several methods. The
+    index gives the position of each estimate in the (unformatted) output.
+
+    """
+    if isinstance(out, np.ndarray):
+        frames = []
+        for k in range(out.shape[0]):
+            row = {
+                name: out[name][k] for name in ('est', 'level', 'lwr', 'upr')
+            }
+            df = _ci_frame(row, str_fmt, est="est")
+            df.insert(0, 'method', str(np.ravel(out['method'][k])[0]))
+            frames.append(df)
+        return(pd.concat(frames))
+
+    shape = np.shape(out[est])
+    df = pd.DataFrame(
+        {k: np.ravel(np.broadcast_to(out[k], shape))
+         for k in (est, "level", "lwr", "upr")}
+    )
+    if len(shape) > 1:
+        df.index = pd.MultiIndex.from_product([range(d) for d in shape])
+    if str_fmt is not None:
+        df['ci'] = pd.Series(_ci_strings(out, str_fmt, est), dtype='string')
+    return(df)
+
+# format estimates and bounds
+def _format_ci(out, str_fmt, est="est", output=None):
+    """
+    Format a dictionary of estimates and bounds as returned by `ci_*()`.
+
+    Parameters
+    ----------
+    out : dict.
+        A dictionary with entries `est`, `level`, `lwr` and `upr`; the
+        name of the first entry is given by `est`.
+    str_fmt : str or None.
+        Passed to `.format_map()` for each estimate. If None, `out` is
+        returned unchanged.
+    est : str, optional.
+        The key in `out` holding the point estimate(s).
+    output : str or None, optional.
+        If "frame", return a tidy DataFrame from `_ci_frame()`. If "lazy"
+        and `str_fmt` is not None, return a `CIResult`. The default, None,
+        returns formatted strings.
+
+    Returns
+    -------
+    `out`, a string, a list of strings, a `CIResult`, or a DataFrame as
+    described in `ci_mean()`.
+
+    """
+    assert output in [None, "lazy", "frame"]
+    if output == "frame":
+        return(_ci_frame(out, str_fmt, est))
     if str_fmt is None:
         return(out)
-    elif est.size == 1:
+    elif output == "lazy":
+        return(CIResult(out, str_fmt, est))
+    elif np.size(out[est]) == 1:
         return(str_fmt.format_map(out))
-    else: 
-        m = len(est)
-        out2 = {i: 
-                {"est": est[i],
-                 "level": 100 * level,
-                 "lwr": lwr[i],
-                 "upr": upr[i]
-                } for i in range(m)}
-        return([str_fmt.format_map(out2[i]) for i in range(m)])
+    else:
+        shape = np.shape(out[est])
+        res = _ci_strings(out, str_fmt, est)
+        if len(shape) > 1:
+            res = np.array(res, dtype='object').reshape(shape).tolist()
+        return(res)
+
+# format estimates and bounds for several methods
+def _format_ci_methods(out, str_fmt, output=None):
+    """
+    Format the structured array returned by `_prop_ci_methods()`.
+
+    Parameters
+    ----------
+    out : structured ndarray.
+        Estimates and bounds with one row per method.
+    str_fmt : str or None.
+        As in `_format_ci()`. If None, `out` is returned unchanged.
+    output : str or None, optional.
+        As in `_format_ci()`; "frame" stacks the methods in a single
+        tidy DataFrame.
+
+    Returns
+    -------
+    `out`, a DataFrame, or a dictionary, keyed by method, of formatted
+    strings or `CIResult` objects.
+
+    """
+    assert output in [None, "lazy", "frame"]
+    if output == "frame":
+        return(_ci_frame(out, str_fmt, est="est"))
+    if str_fmt is None:
+        return(out)
+    res = {}
+    for k in range(out.shape[0]):
+        row = {name: out[name][k] for name in ('est', 'lwr', 'upr')}
+        row["level"] = np.ravel(out['level'])[0]
+        method = str(np.ravel(out['method'][k])[0])
+        res[method] = _format_ci(row, str_fmt, est="est", output=output)
+    return(res)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo coverage studies for confidence intervals for a proportion.
+Stats 507, Fall 2021
+
+This generalizes the simulation study from Problem Set 4, Question 2 into
+a reusable runner. Each (n, p) cell of the grid is simulated from its own
+seed stream, spawned from a single `np.random.SeedSequence`, so results
+are identical no matter how many worker processes are used.
+"""
+# 79: -------------------------------------------------------------------------
+
+# imports
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+from scipy.stats import norm
+from ci_funcs import ci_prop_counts
+
+# default methods, as in the problem set 4 study
+METHODS = ('mean', 'Normal', 'AC', 'CP', 'Jeffrey')
+
+# bounds for a single method from simulated counts
+def _cell_bounds(s, n, level, method):
+    """
+    Compute confidence bounds from simulated successes `s` in `n` trials.
+
+    Parameters
+    ----------
+    s : ndarray of ints.
+        Simulated numbers of successes.
+    n : int.
+        Number of trials.
+    level : float.
+        Confidence level.
+    method : str.
+        "mean" for the interval `ci_mean()` gives on the underlying 0/1
+        data, or any method accepted by `ci_prop_counts()`.
+
+    Returns
+    -------
+    A tuple (lwr, upr) of arrays with NaN replaced by 0 and 1, respectively.
+
+    """
+    if method == 'mean':
+        # ci_mean() for 0/1 data, using the sample variance s(n-s)/(n(n-1))
+        est = s / n
+        se = np.sqrt(s * (n - s) / (n * (n - 1))) / np.sqrt(n)
+        z = norm.ppf(1 - (1 - level) / 2)
+        lwr, upr = est - z * se, est + z * se
+    else:
+        out = ci_prop_counts(
+            s, n, level=level, method=method, str_fmt=None, warn=False
+        )
+        lwr, upr = out['lwr'], out['upr']
+    lwr = np.nan_to_num(lwr, nan=0.0)
+    upr = np.nan_to_num(upr, nan=1.0)
+    return((lwr, upr))
+
+# simulate a single (n, p) cell
+def _sim_cell(n, p, methods, m, level, seed, tol=None, block=1000):
+    """
+    Estimate coverage and average width for one (n, p) cell.
+
+    All methods are evaluated on the same simulated samples. When `tol` is
+    given, samples are drawn in blocks and each method stops once the Monte
+    Carlo standard errors of both its coverage and width fall below `tol`,
+    or after `m` replicates.
+
+    Parameters
+    ----------
+    n, p : int, float.
+        Sample size and population proportion.
+    methods : sequence of str.
+        Interval methods, see `_cell_bounds()`.
+    m : int.
+        Number of Monte Carlo replicates, the maximum if `tol` is given.
+    level : float.
+        Confidence level.
+    seed : np.random.SeedSequence.
+        The seed stream for this cell.
+    tol : float or None, optional.
+        Target Monte Carlo standard error. If None, the default, all `m`
+        replicates are drawn at once.
+    block : int, optional.
+        Replicates drawn per block when `tol` is given. The default is 1000.
+
+    Returns
+    -------
+    A tuple (coverage, width, reps) of arrays with one entry per method,
+    `reps` giving the number of replicates used.
+
+    """
+    rng = np.random.default_rng(seed)
+    if tol is None:
+        block = m
+    k = len(methods)
+    reps, hits = np.zeros(k, dtype='int64'), np.zeros(k, dtype='int64')
+    w_sum, w_ss = np.zeros(k), np.zeros(k)
+    active = np.ones(k, dtype='bool')
+    while active.any():
+        s = rng.binomial(n, p, size=min(block, m - reps[active].max()))
+        for j in np.flatnonzero(active):
+            lwr, upr = _cell_bounds(s, n, level, methods[j])
+            width = upr - lwr
+            reps[j] += s.size
+            hits[j] += np.sum(np.logical_and(lwr < p, upr > p))
+            w_sum[j] += np.sum(width)
+            w_ss[j] += np.sum(width ** 2)
+        active = reps < m
+        if tol is not None:
+            # adjusted (+2/+4) coverage so cells at 0 or 1 have se > 0
+            c = (hits + 2) / (reps + 4)
+            cov_se = np.sqrt(c * (1 - c) / reps)
+            w_var = (w_ss - w_sum ** 2 / reps) / np.maximum(reps - 1, 1)
+            w_se = np.sqrt(np.maximum(w_var, 0) / reps)
+            active &= np.logical_or(cov_se >= tol, w_se >= tol)
+    return((hits / reps, w_sum / reps, reps))
+
+# run a coverage study over a grid
+def coverage_sim(
+    n_seq,
+    p_seq,
+    methods=METHODS,
+    m=10000,
+    level=0.95,
+    seed=None,
+    n_workers=1,
+    tol=None,
+    block=1000
+):
+    """
+    Estimate interval coverage and width over a grid of n and p.
+
+    Samples are drawn as Binomial(n, p) counts, rather than as an (n, m)
+    array of 0/1 values, and all methods in a cell share the same draws.
+    Each (n, p) cell gets an independent child of `SeedSequence(seed)`, so
+    results match bit-for-bit regardless of `n_workers`.
+
+    With `tol` set, the study is adaptive: replicates are generated in
+    blocks of size `block` and each (n, p, method) cell stops once the
+    Monte Carlo standard errors of its coverage and width are both below
+    `tol`, or after `m` replicates. Cells with coverage near 1 or small n
+    typically stop well short of `m`.
+
+    Parameters
+    ----------
+    n_seq : sequence of ints.
+        Sample sizes.
+    p_seq : sequence of floats.
+        Population proportions.
+    methods : sequence of str, optional.
+        Interval methods: "mean" for `ci_mean()` or any `ci_prop()` method.
+        The default is ('mean', 'Normal', 'AC', 'CP', 'Jeffrey').
+    m : int, optional.
+        Number of Monte Carlo replicates per cell, the maximum when `tol`
+        is given. The default is 10000.
+    level : float, optional.
+        Confidence level. The default is 0.95.
+    seed : int, SeedSequence, or None, optional.
+        Entropy for the root `np.random.SeedSequence`. The default is None.
+    n_workers : int, optional.
+        Number of worker processes. With 1, the default, cells are run in
+        the calling process.
+    tol : float or None, optional.
+        Target Monte Carlo standard error for adaptive stopping. The
+        default, None, uses exactly `m` replicates in every cell.
+    block : int, optional.
+        Replicates per block in adaptive mode. The default is 1000.
+
+    Returns
+    -------
+    A dictionary with entries `n`, `p`, and `method` labeling the axes of
+    the arrays `coverage`, `width`, and `reps` (replicates used), each of
+    shape (len(n_seq), len(p_seq), len(methods)).
+
+    """
+    n_seq, p_seq = np.asarray(n_seq), np.asarray(p_seq)
+    methods = tuple(methods)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    # one seed stream per cell, in a fixed order
+    cells = [(n, p) for n in n_seq.tolist() for p in p_seq.tolist()]
+    seeds = seed.spawn(len(cells))
+    args = [
+        (n, p, methods, m, level, ss, tol, block)
+        for (n, p), ss in zip(cells, seeds)
+    ]
+
+    # simulate
+    if n_workers == 1:
+        res = [_sim_cell(*a) for a in args]
+    else:
+        with mp.Pool(n_workers) as pool:
+            res = pool.starmap(_sim_cell, args)
+
+    # organize as array cubes
+    shape = (len(n_seq), len(p_seq), len(methods))
+    coverage = np.stack([r[0] for r in res]).reshape(shape)
+    width = np.stack([r[1] for r in res]).reshape(shape)
+    reps = np.stack([r[2] for r in res]).reshape(shape)
+    return({
+        "n": n_seq,
+        "p": p_seq,
+        "method": methods,
+        "coverage": coverage,
+        "width": width,
+        "reps": reps
+    })
+
+# long format results
+def sim_frame(res):
+    """
+    Convert the array cubes from `coverage_sim()` to a long DataFrame.
+
+    Parameters
+    ----------
+    res : dict.
+        As returned by `coverage_sim()`.
+
+    Returns
+    -------
+    A DataFrame with columns n, p, method, and one column for each
+    remaining array in `res`, matching the `results` table in problem set 4.
+
+    """
+    n, p, method = res['n'], res['p'], res['method']
+    idx = pd.MultiIndex.from_product(
+        [n, p, method], names=['n', 'p', 'method']
+    )
+    cubes = {k: v.ravel() for k, v in res.items() if k not in idx.names}
+    return(pd.DataFrame(cubes, index=idx).reset_index())
+
+# 79: -------------------------------------------------------------------------
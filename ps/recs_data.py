@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar, chunked ingestion of the RECS public use microdata.
+Stats 507, Fall 2021
+
+Problem set 3 reads each RECS csv file in full, 700+ columns, before keeping
+a handful of them. Here the files are streamed in chunks with `usecols` and
+explicit dtypes, so parse time and peak memory scale with the columns kept:
+the sample and replicate weights are read as float32 and the Census region
+as a categorical. Each chunk is written to its own partition of a feather
+or parquet cache, which later calls read back in place of the csv.
+"""
+# 79: -------------------------------------------------------------------------
+
+# imports
+import os
+import shutil
+import pandas as pd
+
+# raw data files
+STEM = 'https://www.eia.gov/consumption/residential/data/'
+FILES = {
+    2009: (
+        STEM + '2009/csv/recs2009_public.csv',
+        STEM + '2009/csv/recs2009_public_repweights.csv'
+    ),
+    2015: (STEM + '2015/csv/recs2015_public_v4.csv', None)
+}
+
+# core columns and their names, as in problem set 3
+CORE_COLS = {
+    'DOEID': 'id',
+    'REGIONC': 'region',
+    'NWEIGHT': 'weight',
+    'HDD65': 'hdd65',
+    'CDD65': 'cdd65'
+}
+
+# Census regions
+REGION = {1: 'Northeast', 2: 'Midwest', 3: 'South', 4: 'West'}
+
+# replicate weight columns and their names
+def rep_cols(year):
+    """
+    Map the replicate weight columns for a survey year to rwt1, ..., rwtR.
+    """
+    if year == 2009:
+        prefix, n_rep = 'brr_weight_', 244
+    elif year == 2015:
+        prefix, n_rep = 'BRRWT', 96
+    else:
+        raise ValueError("RECS year must be 2009 or 2015.")
+    return({prefix + str(i): 'rwt' + str(i) for i in range(1, n_rep + 1)})
+
+# dtypes for the columns read
+def _dtypes(cols):
+    """
+    Choose compact dtypes for the (raw) columns in `cols`.
+
+    Weights are float32, the id and region small integers, and anything
+    else float64. Region labels are applied after parsing, see `_tidy()`.
+    """
+    wts = {'NWEIGHT'}.union(rep_cols(2009), rep_cols(2015))
+    dtypes = {}
+    for c in cols:
+        if c == 'DOEID':
+            dtypes[c] = 'int32'
+        elif c == 'REGIONC':
+            dtypes[c] = 'int8'
+        elif c in wts:
+            dtypes[c] = 'float32'
+        else:
+            dtypes[c] = 'float64'
+    return(dtypes)
+
+# finish a parsed chunk
+_region_dtype = pd.CategoricalDtype(list(REGION.values()))
+
+def _tidy(chunk, names):
+    """
+    Rename the columns of a chunk and label the Census regions.
+
+    The categories are fixed, so chunks concatenate to a categorical.
+    """
+    chunk = chunk.rename(columns=names)
+    if 'region' in chunk.columns:
+        chunk['region'] = chunk['region'].map(REGION).astype(_region_dtype)
+    return(chunk[list(names.values())])
+
+# partition file names
+def _part(cache, i, fmt):
+    """
+    Path of partition `i` in the cache directory `cache`.
+    """
+    return(os.path.join(cache, 'part-{0:05d}.{1:s}'.format(i, fmt)))
+
+# write a single partition
+def _write_part(df, path, fmt):
+    """
+    Write one partition in feather or parquet format.
+    """
+    df = df.reset_index(drop=True)
+    if fmt == 'feather':
+        df.to_feather(path)
+    elif fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError("Cache format must be 'feather' or 'parquet'.")
+
+# read a partitioned cache
+def read_cache(cache, columns=None):
+    """
+    Read the partitions of a cache written by `read_recs()`.
+
+    Parameters
+    ----------
+    cache : str.
+        Cache directory.
+    columns : sequence of str or None, optional.
+        Columns to read, the default (None) reads them all. Both formats
+        are columnar, so only these columns are loaded.
+
+    Returns
+    -------
+    A DataFrame or None if `cache` holds no partitions.
+
+    """
+    if not os.path.isdir(cache):
+        return(None)
+    parts = sorted(f for f in os.listdir(cache) if f.startswith('part-'))
+    if not parts:
+        return(None)
+    columns = None if columns is None else list(columns)
+    frames = []
+    for f in parts:
+        path = os.path.join(cache, f)
+        if f.endswith('.feather'):
+            frames.append(pd.read_feather(path, columns=columns))
+        else:
+            frames.append(pd.read_parquet(path, columns=columns))
+    return(pd.concat(frames, ignore_index=True))
+
+# stream a csv file
+def read_recs(
+    path,
+    names,
+    cache=None,
+    fmt='feather',
+    chunksize=2000
+):
+    """
+    Read selected columns of a RECS csv file in chunks.
+
+    Only the columns in `names` are parsed, with the dtypes from `_dtypes()`.
+    If `cache` is given and already holds partitions, they are read instead
+    of the csv. Otherwise, each chunk is written to a new partition as it
+    is parsed, in a fresh temporary directory whose partitions are moved
+    into `cache` once the whole file has been read. If parsing or writing
+    fails, the temporary directory is removed.
+
+    Parameters
+    ----------
+    path : str.
+        Path or url of the csv file.
+    names : dict.
+        Maps the raw column names to keep to their new names.
+    cache : str or None, optional.
+        Directory for a partitioned cache. The default, None, does not
+        cache.
+    fmt : str, optional.
+        Cache format, "feather" or "parquet". The default is "feather".
+    chunksize : int, optional.
+        Rows per chunk and cache partition. The default is 2000.
+
+    Returns
+    -------
+    A DataFrame with the columns in `names`, renamed.
+
+    """
+    if cache is not None:
+        df = read_cache(cache, columns=names.values())
+        if df is not None:
+            return(df)
+        # start from an empty temporary directory, discarding partitions
+        # left by an interrupted run
+        tmp = cache + '.tmp'
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+
+    cols = list(names.keys())
+    reader = pd.read_csv(
+        path,
+        usecols=cols,
+        dtype=_dtypes(cols),
+        chunksize=chunksize
+    )
+    chunks = []
+    try:
+        for i, chunk in enumerate(reader):
+            chunk = _tidy(chunk, names)
+            if cache is not None:
+                _write_part(chunk, _part(tmp, i, fmt), fmt)
+            chunks.append(chunk)
+    except BaseException:
+        if cache is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # move the partitions into place, keeping any other files in `cache`
+    if cache is not None:
+        if os.path.isdir(cache):
+            for f in sorted(os.listdir(tmp)):
+                os.replace(os.path.join(tmp, f), os.path.join(cache, f))
+            os.rmdir(tmp)
+        else:
+            os.replace(tmp, cache)
+    return(pd.concat(chunks, ignore_index=True))
+
+# RECS data for problem set 3
+def recs_frames(
+    year,
+    path=None,
+    rep_path=None,
+    variables=None,
+    cache=None,
+    fmt='feather',
+    chunksize=2000
+):
+    """
+    Read the core columns and replicate weights for a RECS survey year.
+
+    Parameters
+    ----------
+    year : int.
+        Survey year, 2009 or 2015.
+    path, rep_path : str or None, optional.
+        Local paths or urls of the microdata and, for 2009, the replicate
+        weights. The defaults download from EIA, see `FILES`.
+    variables : dict or None, optional.
+        Columns to read from the microdata and their new names. The default
+        is `CORE_COLS`.
+    cache : str or None, optional.
+        Directory under which partitioned caches are kept, one per year and
+        table. The default, None, does not cache.
+    fmt : str, optional.
+        Cache format, "feather" or "parquet". The default is "feather".
+    chunksize : int, optional.
+        Rows per chunk. The default is 2000.
+
+    Returns
+    -------
+    A tuple (recs, brr) of DataFrames. The replicate weights are wide, with
+    columns id, rwt1, ..., rwtR, as expected by `brr_funcs`.
+
+    """
+    names = CORE_COLS if variables is None else variables
+    reps = {'DOEID': 'id'}
+    reps.update(rep_cols(year))
+    default, default_rep = FILES[year]
+    path = default if path is None else path
+    rep_path = default_rep if rep_path is None else rep_path
+
+    def _cache(table):
+        if cache is None:
+            return(None)
+        return(os.path.join(cache, 'recs{0:d}_{1:s}'.format(year, table)))
+
+    if rep_path is None:
+        # 2015: the weights are in the microdata, read both in one pass
+        both = dict(names)
+        both.update(reps)
+        df = read_recs(path, both, _cache('all'), fmt, chunksize)
+        return((df[list(names.values())], df[list(reps.values())]))
+
+    recs = read_recs(path, names, _cache('core'), fmt, chunksize)
+    brr = read_recs(rep_path, reps, _cache('brr'), fmt, chunksize)
+    return((recs, brr))
+
+# 79: -------------------------------------------------------------------------
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Group-wise maxima over lists of tuples.
+Stats 507, Fall 2021
+
+This generalizes `max_tup()` from Problem Set 2, Question 2. Rather than
+walking the tuples one at a time in Python, the tuples are stacked as rows
+of a 2-D array and the maxima for all groups are found with a single
+`np.argsort` and `np.maximum.reduceat`.
+
+For data that does not fit in memory, `MaxTupReducer` keeps only the
+running maxima and tied tuples for each group while tuples are streamed
+through it in chunks, and reducers filled from different files or
+processes can be merged. `top_k_tup()` generalizes to several grouping
+positions and the k largest tuples per group, keeping a bounded heap for
+each group rather than sorting every group in full.
+
+`gen_list_of_tuples()`, from Problem Set 2, Question 1, can also return
+its sample tuples as a 2-D or structured array without conversion to a
+list, or lazily in chunks, so that benchmarks can separate the cost of
+generating data from the cost of the algorithms.
+"""
+# 79: -------------------------------------------------------------------------
+
+# imports
+import heapq
+import numpy as np
+from itertools import islice
+from numpy.lib import recfunctions as rfn
+
+# sample tuples
+def _as_output(ints, output):
+    """
+    Return a 2-D array of ints as a list of tuples or (zero-copy) array.
+    """
+    if output == 'list':
+        return([tuple(x) for x in ints.tolist()])
+    if output == 'array':
+        return(ints)
+    if output == 'structured':
+        names = ['f' + str(j) for j in range(ints.shape[1])]
+        dt = np.dtype([(name, ints.dtype) for name in names])
+        return(ints.view(dt).reshape(ints.shape[0]))
+    raise ValueError("output must be 'list', 'array', or 'structured'.")
+
+def gen_list_of_tuples(
+    n,
+    tup_size=3,
+    low=0,
+    high=1000,
+    rng=None,
+    output='list',
+    chunk_size=None
+):
+    """
+    Generate n tuples of length tup_size of integers low to high.
+
+    Parameters
+    ----------
+    n : integer
+        The number of tuples.
+    tup_size : integer, optional
+        The length of the tuples created. The default is 3.
+    low : integer, optional
+        The low end of the range to generate integers from.
+    high : integer, optional
+        The high end of the range to generate integers from.
+    rng: A random number generator object, e.g. from np.random.default_rng().
+        If None, one is created within the context of the function.
+    output : str, optional
+        "list" for a list of tuples, the default, "array" for an (n,
+        tup_size) array, or "structured" for a structured array of length
+        n with fields f0, f1, ..., a view of the same memory.
+    chunk_size : integer or None, optional
+        If given, return a generator yielding the tuples in chunks of (at
+        most) this many, each in the format given by `output`. The default,
+        None, generates all n at once.
+
+    Returns
+    -------
+    Uniform random integers in [low, high) as `n` tuples of size `tup_size`,
+    in the format given by `output`, or a generator of such chunks.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if chunk_size is None:
+        ints = rng.integers(low, high, (n, tup_size))
+        return(_as_output(ints, output))
+
+    def _chunks():
+        for start in range(0, n, chunk_size):
+            m = min(chunk_size, n - start)
+            yield _as_output(rng.integers(low, high, (m, tup_size)), output)
+    return(_chunks())
+
+# tuples as a 2-D array
+def _tuple_array(tuple_list):
+    """
+    Stack a list of equal-length tuples as the rows of a 2-D array.
+
+    A 1-d structured array, e.g. from `gen_list_of_tuples()`, has one row
+    per record and one column per field.
+    """
+    if isinstance(tuple_list, np.ndarray) and tuple_list.ndim == 2:
+        return(tuple_list)
+    if isinstance(tuple_list, np.ndarray) and tuple_list.dtype.names:
+        return(rfn.structured_to_unstructured(tuple_list))
+    x = np.asarray(tuple_list)
+    if x.size == 0:
+        return(x.reshape((0, 0)))
+    if x.ndim != 2:
+        raise ValueError("Tuples must all have the same length.")
+    return(x)
+
+# group-wise maxima, vectorized
+def max_tup_np(tuple_list, max_of=2, by=0, as_tuples=True):
+    """
+    Find tuples with maximum value in one position by unique value in another.
+
+    Among all tuples in `tuple_list` sharing a common value in the `by`
+    position, find those also having maximum value in the `max_of` position.
+    As in `max_tup()`, every tuple achieving the maximum is returned, once.
+
+    The rows are sorted by their `by` value, group maxima are found with
+    `np.maximum.reduceat` over the group boundaries, and tied rows are
+    selected by comparing each row to its group maximum. Only the `by`
+    and `max_of` columns are permuted, so the cost is one argsort.
+
+    Parameters
+    ----------
+    tuple_list : list of tuples, 2-D ndarray, or structured array.
+        The tuples, all of the same length, or an array with one per row
+        (or record).
+    max_of : int, optional
+        The position within the tuples to maximize. The default is 2.
+    by : int, optional
+        The position determining which tuples to compare. The default is 0.
+    as_tuples : bool, optional
+        If True, the default, return a list of tuples as `max_tup()` does.
+        Otherwise, return the rows as a 2-D array.
+
+    Returns
+    -------
+    The unique tuples where, for each unique `by` value, the maximum value
+    in the `max_of` position is achieved, sorted by the `by` value.
+    """
+    x = _tuple_array(tuple_list)
+    if x.shape[0] == 0:
+        return([] if as_tuples else x)
+
+    # sort by group, only the two columns used are permuted
+    order = np.argsort(x[:, by])
+    key, val = x[order, by], x[order, max_of]
+
+    # group boundaries and maxima
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    top = np.maximum.reduceat(val, starts)
+    sizes = np.diff(np.r_[starts, len(key)])
+    tied = order[val == np.repeat(top, sizes)]
+
+    # unique rows, sorted by the by value
+    out = np.unique(x[tied], axis=0)
+    out = out[np.argsort(out[:, by], kind='stable')]
+
+    if as_tuples:
+        return([tuple(r) for r in out.tolist()])
+    return(out)
+
+# streaming group-wise maxima
+class MaxTupReducer:
+    """
+    Reduce a stream of tuples to the group-wise maxima of `max_tup_np()`.
+
+    The state is just the unique tuples achieving the maximum so far for
+    each `by` value. Each chunk is stacked with the state and reduced by
+    `max_tup_np()`; since the maxima of a union are the maxima of the
+    maxima of its parts, `.merge()` is associative and reducers filled from
+    different files or processes can be combined in any order.
+
+    Parameters
+    ----------
+    max_of : int, optional
+        The position within the tuples to maximize. The default is 2.
+    by : int, optional
+        The position determining which tuples to compare. The default is 0.
+    """
+
+    def __init__(self, max_of=2, by=0):
+        self.max_of = max_of
+        self.by = by
+        self.n = 0
+        self.rows = None
+
+    def _reduce(self, x):
+        if x.shape[0] == 0:
+            return(self)
+        if self.rows is not None:
+            x = np.concatenate([self.rows, x])
+        self.rows = max_tup_np(x, self.max_of, self.by, as_tuples=False)
+        return(self)
+
+    def update(self, chunk):
+        """
+        Add a chunk of tuples (or 2-D or structured array) and return the
+        reducer.
+        """
+        x = _tuple_array(chunk)
+        self.n += x.shape[0]
+        return(self._reduce(x))
+
+    def consume(self, tuples, chunk_size=100000):
+        """
+        Add tuples from an iterator, `chunk_size` at a time.
+        """
+        tuples = iter(tuples)
+        chunk = list(islice(tuples, chunk_size))
+        while chunk:
+            self.update(chunk)
+            chunk = list(islice(tuples, chunk_size))
+        return(self)
+
+    def merge(self, other):
+        """
+        Merge the state of another `MaxTupReducer` into this one.
+        """
+        if (other.max_of, other.by) != (self.max_of, self.by):
+            raise ValueError("Reducers must share `max_of` and `by`.")
+        self.n += other.n
+        if other.rows is None:
+            return(self)
+        return(self._reduce(other.rows))
+
+    def result(self, as_tuples=True):
+        """
+        Return the tuples achieving each group maximum, see `max_tup_np()`.
+        """
+        if self.rows is None:
+            return([] if as_tuples else np.empty((0, 0)))
+        if as_tuples:
+            return([tuple(r) for r in self.rows.tolist()])
+        return(self.rows)
+
+# positions of a tuple
+def _getter(pos):
+    """
+    Return a function extracting position(s) `pos` from a tuple.
+
+    An int gives the value itself, a sequence gives a tuple of values.
+    """
+    if isinstance(pos, (int, np.integer)):
+        return(lambda tup: tup[pos])
+    pos = tuple(pos)
+    return(lambda tup: tuple(tup[j] for j in pos))
+
+# top-k tuples by group
+def top_k_tup(tuple_list, k=1, max_of=2, by=0, ties=False):
+    """
+    Find the k tuples with the largest values in one or more positions, by
+    unique values in one or more other positions.
+
+    Each group keeps a min-heap of at most `k` entries, so a single pass
+    over `tuple_list`, which may be any iterable, takes O(n log k) time and
+    O(groups * k) memory.
+
+    Parameters
+    ----------
+    tuple_list : iterable of tuples
+        The tuples to organize as described above.
+    k : int, optional
+        The number of tuples to keep per group. The default is 1.
+    max_of : int or sequence of ints, optional
+        The position(s) within the tuples to maximize, compared
+        lexicographically when several are given. The default is 2.
+    by : int or sequence of ints, optional
+        The position(s) determining which tuples to compare. The default
+        is 0.
+    ties : bool, optional
+        If True, tuples tied with the k-th largest are also kept, so with
+        `k=1` the tuples returned are those of `max_tup()`. The default is
+        False, keeping the first tuples seen among ties.
+
+    Returns
+    -------
+    A dict mapping each unique `by` value, a tuple if `by` is a sequence,
+    to a list of its top tuples from largest to smallest.
+    """
+    key_of, val_of = _getter(by), _getter(max_of)
+    heaps, extra = {}, {}
+    for i, tup in enumerate(tuple_list):
+        g, v = key_of(tup), val_of(tup)
+        heap = heaps.setdefault(g, [])
+        # entries order by value, then by earliest first among ties
+        entry = (v, -i, tup)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif v > heap[0][0]:
+            low = heapq.heapreplace(heap, entry)
+            if ties and low[0] == heap[0][0]:
+                extra.setdefault(g, []).append(low)
+            elif ties:
+                extra.pop(g, None)
+        elif ties and v == heap[0][0]:
+            extra.setdefault(g, []).append(entry)
+
+    out = {}
+    for g, heap in heaps.items():
+        entries = sorted(heap + extra.get(g, []), reverse=True)
+        out[g] = [e[2] for e in entries]
+    return(out)
+
+# 79: -------------------------------------------------------------------------